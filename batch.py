@@ -0,0 +1,59 @@
+# My Code
+
+# Parsing many programs at once. compile_files hands the paths out, in chunks, to a pool of worker
+# processes, each of which reads its files and runs pipeline.compile_program on every one, as
+# Interpreter.run does before the engines start. The tree each gives comes back serialized the way
+# cache.py stores it, so the parent only unpickles what it runs, with Interpreter.run_compiled. Results are in the order of the paths given.
+#
+# A file that does not compile gives data None and what went wrong in errors, as does one that cannot
+# be read; the batch carries on with the rest. The parser prints syntax errors rather than raising
+# them, and may still give a tree after recovering from one, so what it prints goes into errors too.
+
+import collections
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import os
+
+from cache import dumps
+from pipeline import compile_program
+
+Compiled = collections.namedtuple('Compiled', 'path data errors')      # data: dumps of what compile_program gave, or None
+SUFFIX = '.br'
+CHUNKS = 4      # chunks per worker: few enough to keep the pool's overhead low, enough to even out the load
+
+
+def sources(directory):     # the programs in a directory laid out like v{N}/tests/, by name
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SUFFIX))
+
+
+def compile_file(path, options):        # runs in a worker
+    messages = io.StringIO()
+    data = None
+    error = None
+    try:
+        with open(path, encoding='utf-8') as f:
+            program = f.read()
+        with contextlib.redirect_stdout(messages):      # syntax errors and illegal characters
+            entry = compile_program(program, *options)
+        data = dumps(entry)
+    except Exception as e:      # reported with the file, the rest of the batch goes on
+        error = f"{type(e).__name__}: {e}"
+    errors = messages.getvalue().splitlines()
+    if error is not None:
+        errors.append(error)
+    return Compiled(path, data, errors)
+
+
+def compile_files(paths, workers=None, fold=True, licm=True, backend=None):     # a Compiled for each path, in order
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * CHUNKS))
+    options = (fold, licm, backend)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(compile_file, paths, itertools.repeat(options), chunksize=chunksize))
+
+
+def compile_directory(directory, **kwargs):
+    return compile_files(sources(directory), **kwargs)
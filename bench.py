@@ -0,0 +1,674 @@
+"""
+Micro-benchmarks for the interpreter engines. Run `python bench.py` for all of them,
+or `python bench.py <name> ...` for a subset.
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+with contextlib.redirect_stdout(io.StringIO()):     # interpreterv4 runs its example program on import
+    from interpreterv4 import Interpreter
+    from brewparse import parse_program, Parser
+    import batch
+
+
+ARITH_LOOP = """
+def main() {
+  var ii;
+  var si;
+  ii = 0;
+  si = 0;
+  while (ii < 200000) {
+    si = si + ii * 3 - ii / 2;
+    ii = ii + 1;
+  }
+  print(si);
+}
+"""
+
+NESTED_LOOP = """
+def main() {
+  var ai;
+  var bi;
+  var ci;
+  var ti;
+  ai = 0;
+  while (ai < 200) {
+    bi = 0;
+    while (bi < 100) {
+      if (bi > ai) {
+        ci = ci + 1;
+      } else {
+        ti = ti + ai - bi;
+      }
+      bi = bi + 1;
+    }
+    ai = ai + 1;
+  }
+  print(ci, " ", ti);
+}
+"""
+
+OBJECT_PATHS = """
+def main() {
+  var ao;
+  var ii;
+  ao = @;
+  ao.bo = @;
+  ao.bo.co = @;
+  ao.bo.co.vali = 0;
+  while (ii < 30000) {
+    ao.bo.co.vali = ao.bo.co.vali + ii;
+    ii = ii + 1;
+  }
+  print(ao.bo.co.vali);
+}
+"""
+
+INTERFACE_CALLS = """
+interface P {
+  xi;
+  yi;
+  normf();
+}
+def lengthi(pP) {
+  return pP.normf();
+}
+def main() {
+  var po;
+  var ii;
+  var ti;
+  po = @;
+  po.xi = 3;
+  po.yi = 4;
+  po.normf = lambdai() { return selfo.xi * selfo.xi + selfo.yi * selfo.yi; };
+  while (ii < 5000) {
+    ti = ti + lengthi(po);
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+HELPERS = 300       # overloaded helpers in OVERLOADED_CALLS, three overloads each
+
+OVERLOADED_CALLS = "".join(f"""
+def h{n}i(xi) {{ return xi + {n}; }}
+def h{n}i(xi, yi) {{ return xi + yi; }}
+def h{n}i(xs) {{ return {n}; }}""" for n in range(HELPERS)) + f"""
+def main() {{
+  var ii;
+  var ti;
+  var hf;
+  while (ii < 5000) {{
+    ti = ti + h{HELPERS - 1}i(ii) + h{HELPERS - 1}i(ii, 1) + h{HELPERS - 1}i("x");
+    hf = h{HELPERS - 1}i;
+    ii = ii + 1;
+  }}
+  print(ti);
+}}
+"""
+
+OBJECT_ARGS = """
+def touchi(lo) {
+  return 1;
+}
+def main() {
+  var lo;
+  var no;
+  var ii;
+  var ti;
+  while (ii < SIZE) {
+    no = @;
+    no.nexto = lo;
+    lo = no;
+    ii = ii + 1;
+  }
+  ii = 0;
+  while (ii < 2000) {
+    ti = ti + touchi(lo);
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+LOOP_BLOCKS = """
+def main() {
+  var ii;
+  var ti;
+  while (ii < 1000000) {
+    if (ii > 0) {
+      ti = ti + 1;
+    }
+    ii = ii + 1;
+  }
+  ii = 0;
+  while (ii < 1000000) {
+    bvar ki;
+    ki = ii;
+    ti = ti + ki;
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+LOCALS = 60         # variables in scope where LAMBDA_LOOP creates its lambdas
+
+LAMBDA_LOOP = """
+def main() {
+  var ii;
+  var ti;
+  var lf;""" + "".join(f"""
+  var v{n}i;""" for n in range(LOCALS)) + """
+  while (ii < 20000) {
+    lf = lambdai() { return ii * 2; };
+    ti = ti + lf();
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+DEEP_RECURSION = """
+def downi(ni) {
+  if (ni == 0) {
+    return 0;
+  }
+  return 1 + downi(ni - 1);
+}
+def main() {
+  print(downi(50000));
+}
+"""
+
+TAIL_LOOP = """
+def loopi(ni, ai) {
+  if (ni == 0) {
+    return ai;
+  }
+  return loopi(ni - 1, ai + 1);
+}
+def main() {
+  print(loopi(1000000, 0));
+}
+"""
+
+CONSTANT_EXPRESSIONS = """
+def main() {
+  var ii;
+  var ti;
+  var ss;
+  while (ii < 30000) {
+    ti = ti + 3 * 4 + 1 - 60 / 5;
+    if (!false && 2 < 3) {
+      ss = str(10) + "px";
+    }
+    ii = ii + 1;
+  }
+  print(ti, " ", ss);
+}
+"""
+
+INVARIANT_BOUNDS = """
+def main() {
+  var ao;
+  ao = @;
+  ao.limiti = 15000;
+  ao.stepi = 3;
+  var ii;
+  var ti;
+  while (ii < ao.limiti * 2) {
+    ti = ti + ao.stepi * ao.stepi - 1;
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+ALIASED_REFERENCES = """
+def fv(&ai, &bi) {
+  var ci;
+  while (ci < 3) {
+    bi = bi + 1;
+    print(ai + 100);
+    ci = ci + 1;
+  }
+}
+def main() {
+  var xi;
+  fv(xi, xi);
+}
+"""
+
+SMALL_HELPERS = """
+def sqi(xi) { return xi * xi; }
+def clampi(xi, hi) { var ri; ri = xi - xi / hi * hi; return ri; }
+def bumpv(&ti) { ti = ti + 1; }
+def main() {
+  var ii;
+  var ki;
+  var ti;
+  while (ii < 50000) {
+    ki = clampi(ii, 7);
+    ti = ti + sqi(ki);
+    bumpv(ti);
+    ii = ii + 1;
+  }
+  print(ti);
+}
+"""
+
+CALL_CONDITIONS = """
+def belowb(ci, ni) { return ci < ni; }
+def main() {
+  var ii;
+  var ji;
+  while (belowb(ii, 200)) {
+    ji = 0;
+    while (belowb(ji, 100)) {
+      ji = ji + 1;
+    }
+    ii = ii + 1;
+  }
+  print(ii * ji);
+}
+"""
+
+GUARDED_CALLS = """
+def deepb(ni) {
+  if (ni == 0) { return true; }
+  return deepb(ni - 1);
+}
+def main() {
+  var ii;
+  var hi;
+  var ao;
+  while (ii < 2000) {
+    if (ao != nil && deepb(20)) { hi = hi + 1; }
+    if (ii < 1600 || deepb(20)) { hi = hi + 1; }
+    ii = ii + 1;
+  }
+  print(hi);
+}
+"""
+
+
+STARTUP = """
+import contextlib, io, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from interpreterv4 import Interpreter
+    imported = time.perf_counter()
+    Interpreter().run("def main() { print(1); }")
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def generated_program(lines):       # about that many lines: small functions, each called once from main
+    functions = lines // 11
+    parts = [f"""def f{n}i(ai, bi) {{
+  var ci;
+  ci = ai * 2 + bi;
+  if (ci > 10) {{
+    ci = ci - 10;
+  }}
+  while (ci < 5) {{
+    ci = ci + 1;
+  }}
+  return ci;
+}}""" for n in range(functions)]
+    calls = "".join(f"  ti = ti + f{n}i({n}, 1);\n" for n in range(functions))
+    return "\n".join(parts) + "\ndef main() {\n  var ti;\n" + calls + "  print(ti);\n}\n"
+
+
+def parse_corpus(size):     # programs of different lengths, every fifth with a syntax error on a different line
+    programs = []
+    for n in range(size):
+        program = generated_program(20 + n % 37 * 4)
+        if n % 5 == 0:
+            lines = program.split("\n")
+            lines.insert(n % 17 + 1, "  var ;")
+            program = "\n".join(lines)
+        programs.append(program)
+    return programs
+
+
+def parse_outcome(program):     # something to compare: the whole tree as text, or the error
+    try:
+        return str(parse_program(program))
+    except SyntaxError as e:
+        return repr(e)
+
+
+def parser_outcome(parser, program):        # the same, from one Parser
+    try:
+        return str(parser.parse(program))
+    except SyntaxError as e:
+        return repr(e)
+
+
+def run_program(program, **kwargs):
+    elapsed, interpreter = run_interpreter(program, **kwargs)
+    return elapsed, interpreter.get_output()
+
+
+def run_interpreter(program, **kwargs):
+    interpreter = Interpreter(False, None, False, **kwargs)
+    start = time.perf_counter()
+    interpreter.run(program)
+    return time.perf_counter() - start, interpreter
+
+
+def bench_engines():
+    """Arithmetic-heavy while loop under each engine."""
+    baseline = None
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(ARITH_LOOP, engine=engine)
+        baseline = baseline or elapsed
+        print(f"  {engine:10} {elapsed:8.3f}s  {baseline / elapsed:5.2f}x  {output}")
+
+
+def bench_scopes():
+    """Function-level variables read and written from nested blocks."""
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(NESTED_LOOP, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+
+
+def bench_paths():
+    """Dotted member reads and writes in a loop."""
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(OBJECT_PATHS, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+
+
+def bench_interfaces():
+    """Objects passed through interface-typed parameters, with the compliance cache counters."""
+    for engine in Interpreter.ENGINES:
+        elapsed, interpreter = run_interpreter(INTERFACE_CALLS, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  hits {interpreter.interface_hits}  misses {interpreter.interface_misses}")
+
+
+def bench_overloads():
+    """Calls to, and references of, one of many overloaded functions."""
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(OVERLOADED_CALLS, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+
+
+def bench_object_args():
+    """Calls passing a linked list of growing length; call cost should not grow with it."""
+    for size in (10, 100, 1000):
+        elapsed, output = run_program(OBJECT_ARGS.replace("SIZE", str(size)))
+        print(f"  {size:6} nodes {elapsed:8.3f}s  {output}")
+
+
+def bench_blocks():
+    """10^6-iteration loops, one over a block without variables and one declaring a block variable."""
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(LOOP_BLOCKS, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+
+
+def bench_lambdas():
+    """Lambdas created in a loop, using one of many variables in scope."""
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(LAMBDA_LOOP, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+
+
+def recursion_runs(depth, engine):
+    try:
+        run_program(DEEP_RECURSION.replace("50000", str(depth)), engine=engine)
+    except Exception:
+        return False
+    return True
+
+
+def deepest_recursion(engine, limit=2000):     # the deepest downi(n), up to limit, the engine runs at Python's recursion limit
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if recursion_runs(middle, engine):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def bench_recursion():
+    """Brewin recursion 50000 calls deep; only the vm runs it, the others stop with a STACK_ERROR. Then the deepest each engine runs."""
+    for engine in Interpreter.ENGINES:
+        try:
+            elapsed, output = run_program(DEEP_RECURSION, engine=engine)
+        except Exception as e:
+            elapsed, output = 0.0, str(e).split(":")[0]
+        print(f"  {engine:10} {elapsed:8.3f}s  {output}")
+    depths = {engine: deepest_recursion(engine) for engine in Interpreter.ENGINES}
+    print(f"  deepest recursion run: {depths}  closure as deep as tree: {depths['closure'] >= depths['tree']}")
+
+
+def bench_tail_calls():
+    """A million-deep tail-recursive loop on the vm, with at most 100 calls allowed to be in progress."""
+    elapsed, output = run_program(TAIL_LOOP, engine='vm', max_depth=100)
+    print(f"  {'vm':10} {elapsed:8.3f}s  {output}")
+
+
+def bench_folding():
+    """Loop over expressions made of literals, with and without constant folding."""
+    for engine in Interpreter.ENGINES:
+        for fold in (False, True):
+            elapsed, interpreter = run_interpreter(CONSTANT_EXPRESSIONS, engine=engine, fold=fold)
+            print(f"  {engine:10} fold={fold!s:5} {elapsed:8.3f}s  {interpreter.get_output()}  {interpreter.fold_stats}")
+
+
+def bench_invariants():
+    """Loop bound and body computed from members the loop never changes, with and without licm.py; then & parameters that alias."""
+    for engine in Interpreter.ENGINES:
+        for licm in (False, True):
+            elapsed, interpreter = run_interpreter(INVARIANT_BOUNDS, engine=engine, licm=licm)
+            print(f"  {engine:10} licm={licm!s:5} {elapsed:8.3f}s  {interpreter.get_output()}  hoisted {interpreter.hoisted}")
+    outputs = {(engine, licm): run_program(ALIASED_REFERENCES, engine=engine, licm=licm)[1]
+               for engine in Interpreter.ENGINES for licm in (False, True)}
+    print(f"  two & parameters bound to one variable, same output with and without licm: {len(set(map(tuple, outputs.values()))) == 1}  "
+          f"{outputs['tree', True]}")
+
+
+def bench_inlining():
+    """Calls to one- and two-statement helpers on the closure engine, with and without inlining."""
+    for inline in (False, True):
+        elapsed, interpreter = run_interpreter(SMALL_HELPERS, engine='closure', inline=inline)
+        print(f"  {'closure':10} inline={inline!s:5} {elapsed:8.3f}s  {interpreter.get_output()}  inlined {interpreter.inlined}")
+
+
+def bench_loop_conditions():
+    """Nested loops whose conditions call a function, with and without iteration counting."""
+    for engine in Interpreter.ENGINES:
+        for count_loops in (False, True):
+            elapsed, interpreter = run_interpreter(CALL_CONDITIONS, engine=engine, count_loops=count_loops)
+            counts = sorted(interpreter.loop_counts.values())
+            print(f"  {engine:10} count_loops={count_loops!s:5} {elapsed:8.3f}s  {interpreter.get_output()}  {counts}")
+
+
+def bench_short_circuit():
+    """Guard conditions in front of deep calls, evaluating both operands and with short_circuit."""
+    for engine in Interpreter.ENGINES:
+        for short_circuit in (False, True):
+            elapsed, output = run_program(GUARDED_CALLS, engine=engine, short_circuit=short_circuit)
+            print(f"  {engine:10} short_circuit={short_circuit!s:5} {elapsed:8.3f}s  {output}")
+
+
+def bench_large_program():
+    """Memory taken by the AST of a 50k-line program, and the time to parse and run it."""
+    program = generated_program(50000)
+    tracemalloc.start()
+    ast = parse_program(program)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  AST {size / 2**20:8.1f} MiB  ({program.count(chr(10))} lines)")
+    del ast
+
+    for engine in Interpreter.ENGINES:
+        elapsed, output = run_program(program, engine=engine)
+        print(f"  {engine:10} {elapsed:8.3f}s parse and run  {output}")
+
+
+def bench_ast_cache():
+    """A 50k-line program run twice through an on-disk AST cache: parsed the first time, loaded the second."""
+    program = generated_program(50000)
+    directory = tempfile.mkdtemp()
+    try:
+        for run in ('cold', 'warm'):
+            elapsed, interpreter = run_interpreter(program, cache_dir=directory)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print(f"  {run:10} {elapsed:8.3f}s parse and run  {interpreter.get_output()}  "
+                  f"hits {interpreter.cache.hits}  cache {size / 2**20:.1f} MiB")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_startup():
+    """Fresh processes importing interpreterv4 and running one statement, without and with BREWIN_FAST_STARTUP."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for fast in ('0', '1'):
+        env = dict(os.environ, BREWIN_FAST_STARTUP=fast)
+        imports, firsts = [], []
+        for _ in range(20):
+            result = subprocess.run([sys.executable, '-c', STARTUP], cwd=here, env=env, capture_output=True, text=True, check=True)
+            imported, first = map(float, result.stdout.split())
+            imports.append(imported)
+            firsts.append(first)
+        print(f"  fast={fast}  import {1000 * statistics.median(imports):7.1f}ms  "
+              f"to first statement {1000 * statistics.median(firsts):7.1f}ms  (median of 20)")
+
+
+def bench_parallel_parse():
+    """400 programs, a fifth of them with syntax errors, parsed on one thread and then on 8; the results must match."""
+    programs = parse_corpus(400)
+    results = {}
+    for threads in (1, 8):
+        messages = io.StringIO()        # the syntax errors reported, with their line numbers
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(messages), concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            outcomes = list(pool.map(parse_outcome, programs))
+        elapsed = time.perf_counter() - start
+        results[threads] = outcomes, sorted(messages.getvalue().splitlines())
+        print(f"  {threads} threads {elapsed:8.3f}s  {len(results[threads][1])} syntax errors reported")
+    print(f"  same trees and errors: {results[1] == results[8]}")
+
+
+def bench_lexers():
+    """A 50k-line program through PLY's lexer and scanner.py's, on their own and with the parser."""
+    program = generated_program(50000)
+    for scanner in (False, True):
+        parser = Parser(scanner)
+        lexer = parser.lexer
+        lexer.lineno = 1
+        lexer.input(program)
+        start = time.perf_counter()
+        count = 0
+        while lexer.token() is not None:
+            count += 1
+        lexed = time.perf_counter() - start
+        start = time.perf_counter()
+        parser.parse(program)
+        parsed = time.perf_counter() - start
+        name = "scanner" if scanner else "ply"
+        print(f"  {name:10} {lexed:8.3f}s lex  {parsed:8.3f}s parse  ({count} tokens)")
+
+
+def bench_parsers():
+    """PLY's parser and pratt.py's, with each lexer, over the parallel_parse corpus and a 50k-line program (best of 3); the results must match."""
+    corpus = parse_corpus(400)
+    program = generated_program(50000)
+    results = {}
+    for scanner in (False, True):
+        for backend in ("ply", "pratt"):
+            parser = Parser(scanner, backend)
+            corpus_times, program_times = [], []
+            for _ in range(3):
+                messages = io.StringIO()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(messages):
+                    outcomes = [parser_outcome(parser, source) for source in corpus]
+                corpus_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                ast = parser.parse(program)
+                program_times.append(time.perf_counter() - start)
+            results[scanner, backend] = tuple(outcomes), messages.getvalue(), str(ast)
+            lexer = "scanner" if scanner else "ply"
+            print(f"  {backend:6} {lexer:8} lexer {min(corpus_times):8.3f}s corpus  {min(program_times):8.3f}s 50k lines")
+    print(f"  same trees and errors: {len(set(results.values())) == 1}")
+
+
+def bench_batch():
+    """2000 .br files compiled by batch.compile_directory with 1 worker and with one per core (at least 2); the results must match."""
+    directory = tempfile.mkdtemp()
+    try:
+        for n, program in enumerate(parse_corpus(2000)):
+            with open(os.path.join(directory, f"p{n:04}.br"), "w") as f:
+                f.write(program)
+        results = {}
+        for workers in (1, max(2, os.cpu_count() or 1)):
+            start = time.perf_counter()
+            results[workers] = batch.compile_directory(directory, workers=workers)
+            elapsed = time.perf_counter() - start
+            failed = sum(result.data is None for result in results[workers])
+            print(f"  {workers:2} workers {elapsed:8.3f}s  {failed} files failed")
+        first, last = results.values()
+        print(f"  same results: {first == last}")
+        compiled = next(result for result in last if result.data is not None and not result.errors)
+        interpreter = Interpreter(False, None, False)
+        interpreter.run_compiled(compiled.data)
+        with open(compiled.path) as f:
+            _, output = run_program(f.read())
+        print(f"  run_compiled matches run: {interpreter.get_output() == output}")
+    finally:
+        shutil.rmtree(directory)
+
+
+BENCHMARKS = {
+    "engines": bench_engines,
+    "scopes": bench_scopes,
+    "paths": bench_paths,
+    "interfaces": bench_interfaces,
+    "overloads": bench_overloads,
+    "object_args": bench_object_args,
+    "blocks": bench_blocks,
+    "lambdas": bench_lambdas,
+    "recursion": bench_recursion,
+    "tail_calls": bench_tail_calls,
+    "folding": bench_folding,
+    "invariants": bench_invariants,
+    "inlining": bench_inlining,
+    "loop_conditions": bench_loop_conditions,
+    "short_circuit": bench_short_circuit,
+    "large_program": bench_large_program,
+    "ast_cache": bench_ast_cache,
+    "startup": bench_startup,
+    "parallel_parse": bench_parallel_parse,
+    "lexers": bench_lexers,
+    "parsers": bench_parsers,
+    "batch": bench_batch,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        print(f"{name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,3 +1,6 @@
+import contextlib
+import os
+import threading
 from ply import lex
 
 reserved = (
@@ -135,11 +138,40 @@ def t_STRING(t):
 
 
 def t_error(t):
-    print(f"Illegal character {t.value[0]}")
+    report(f"Illegal character {t.value[0]}")
     t.lexer.skip(1)
 
+
+# Illegal characters and syntax errors are printed as they are found. A caller that wants them too, such
+# as cache.py, which prints them again when it hands back a tree parsed earlier, collects the ones
+# reported on its thread with `with reported() as messages:`.
+REPORTED = threading.local()
+
+
+def report(message):
+    print(message)
+    messages = getattr(REPORTED, "messages", None)
+    if messages is not None:
+        messages.append(message)
+
+
+@contextlib.contextmanager
+def reported():
+    outer = getattr(REPORTED, "messages", None)
+    REPORTED.messages = []
+    try:
+        yield REPORTED.messages
+    finally:
+        REPORTED.messages = outer
+
 def reset_lineno():
     lexer.lineno = 1
 
-# Build the lexer
-lexer = lex.lex()
+# Build the lexer. With BREWIN_FAST_STARTUP=1 in the environment, it is loaded from the tables frozen in
+# lextab.py instead, without checking the rules above or writing any file; `python brewparse.py` rewrites
+# lextab.py and parsetab.py after the rules or the grammar change.
+FAST_STARTUP = os.environ.get("BREWIN_FAST_STARTUP", "") not in ("", "0")
+if FAST_STARTUP:
+    lexer = lex.lex(optimize=True, lextab="lextab")
+else:
+    lexer = lex.lex()
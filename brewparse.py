@@ -1,7 +1,15 @@
-from element import Element
+import copy
+import functools
+import itertools
+import os
+import queue
+from element import Element, QualifiedName, collector_paused
+import brewlex
 from brewlex import *
 from intbase import InterpreterBase
-from ply import yacc
+from scanner import Scanner
+from pratt import PrattParser, ParseError, binding_powers
+from ply import lex, yacc
 
 # Parsing rules
 
@@ -115,13 +123,13 @@ def p_qualified_name(p):
     """qualified_name : qualified_name DOT NAME
     | NAME"""
     if len(p) == 4:
-        p[0] = p[1] + "." + p[3]
+        p[0] = QualifiedName(p[1] + "." + p[3])
     else:
-        p[0] = p[1]
+        p[0] = QualifiedName(p[1])
 
 def p_qualified_name_no_dot(p):
     """qualified_name_no_dot : NAME"""
-    p[0] = p[1] 
+    p[0] = QualifiedName(p[1])
 
 def p_statement_if(p):
     """statement : IF LPAREN expression RPAREN LBRACE statements RBRACE
@@ -269,25 +277,82 @@ def p_expression_lambda(p):
 
 def p_error(p):
     if p:
-        print(f"Syntax error at '{p.value}' on line {p.lineno}")
+        report(f"Syntax error at '{p.value}' on line {p.lineno}")
     else:
-        print("Syntax error at EOF")
+        report("Syntax error at EOF")
 
 
 # exported function
-def parse_program(program, plot = False):
-    reset_lineno()
-    ast = yacc.parse(program)
-    if ast is None:
-        raise SyntaxError("Syntax error")
-    
-    # Plot the AST if requested
-    if plot:
-        from plot import plot_ast
-        plot_ast(ast)
-    
-    return ast
+def parse_program(program, plot = False, backend = None):      # safe to call from several threads at once, see ParserPool
+    return POOLS[backend or BACKEND].parse(program, plot)
+
+
+SCANNER = os.environ.get("BREWIN_SCANNER", "") not in ("", "0")       # default to scanner.py's lexer rather than PLY's
+BACKENDS = ("ply", "pratt")     # PLY's LALR parser, or pratt.py's hand-written one
+BACKEND = os.environ.get("BREWIN_PARSER", "ply")
+BINDING = binding_powers(precedence)
+
+
+class Parser:       # a lexer and LR parser of its own, so Parsers on different threads share no state
+
+    def __init__(self, scanner=SCANNER, backend=BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown parser backend {backend}, expected one of {BACKENDS}")
+        self.lexer = Scanner() if scanner else lexer.clone()
+        self.parser = copy.copy(PARSER)     # keeps the tables, which are only ever read, but gets its own parse stacks
+        self.pratt = PrattParser(self.lexer, BINDING) if backend == "pratt" else None
+
+    def parse(self, program, plot=False):
+        self.lexer.lineno = 1
+        error = None
+        with collector_paused():        # a parse only makes the tree, see element.collector_paused
+            if self.pratt is None:
+                ast = self.parser.parse(program, lexer=self.lexer)
+            else:
+                try:
+                    ast = self.pratt.parse(program)
+                except (ParseError, RecursionError) as e:      # PLY reports it, from the same tokens
+                    error = e
+                    tokens = itertools.chain(self.pratt.seen, iter(self.lexer.token, None))
+                    ast = self.parser.parse(lexer=self.lexer, tokenfunc=functools.partial(next, tokens, None))
+        if ast is None:
+            raise SyntaxError("Syntax error") from error
+
+        # Plot the AST if requested
+        if plot:
+            from plot import plot_ast
+            plot_ast(ast)
+
+        return ast
+
+
+class ParserPool:       # Parsers lent out to one caller at a time, so there are as many as there are threads parsing at once
+
+    def __init__(self, scanner=SCANNER, backend=BACKEND):
+        self.scanner = scanner
+        self.backend = backend
+        self.idle = queue.SimpleQueue()
+
+    def parse(self, program, plot=False):
+        try:
+            parser = self.idle.get_nowait()
+        except queue.Empty:
+            parser = Parser(self.scanner, self.backend)
+        try:
+            return parser.parse(program, plot)
+        finally:
+            self.idle.put(parser)
 
 
 # generate our parser
-yacc.yacc() # yacc.yacc(debug=True, debuglog=open("parse.log", "w"))
+if FAST_STARTUP:        # the tables in parsetab.py as they are, no grammar checks, no parser.out
+    PARSER = yacc.yacc(optimize=True, debug=False, write_tables=False)
+else:
+    PARSER = yacc.yacc() # yacc.yacc(debug=True, debuglog=open("parse.log", "w"))
+POOLS = {backend: ParserPool(backend=backend) for backend in BACKENDS}
+
+
+if __name__ == "__main__":      # rewrite the frozen tables
+    here = os.path.dirname(os.path.abspath(__file__))
+    lex.lex(module=brewlex).writetab("lextab", here)
+    yacc.yacc(debug=False, outputdir=here)
@@ -0,0 +1,150 @@
+# My Code
+
+# On-disk cache of parsed programs. Interpreter.run parses a program and runs fold.py and licm.py over
+# it before anything else looks at the tree, and all of that only depends on the source text and the
+# options those passes take. ASTCache keeps the tree they give, as a compressed pickle, in a file named
+# after a hash of the source, those options and the code that builds the tree, so running the same
+# source again just loads it. The directory is kept under max_bytes by deleting the files least
+# recently used (their modification time is bumped on every hit).
+#
+# Only what Interpreter.run needs before the engines start is cached: resolver.py, typecheck.py and the
+# engines still work over the loaded tree, as their results depend on the engine and other options.
+
+import ast
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+from element import collector_paused
+
+MAX_BYTES = 256 * 2**20         # default size bound of a cache directory
+SUFFIX = '.ast'
+ROOTS = ('pipeline', 'cache')      # modules that build and store a cached tree
+TABLES = ('lextab.py', 'parsetab.py')       # frozen tables brewparse loads rather than imports
+VERSION = 2
+
+
+def sources(roots=ROOTS):       # file names of roots and the modules in this directory they import at load time, directly or not
+    here = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        path = os.path.join(here, name + '.py')
+        if name in found or not os.path.exists(path):       # seen already, or a package or outside this directory
+            continue
+        found.add(name)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:      # not imports inside functions, such as brewparse's of plot.py
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                pending.append(node.module)
+    return sorted(name + '.py' for name in found)
+
+
+def code_version():     # hash of the code that shapes a cached tree, so it is never used by code that would build a different one
+    digest = hashlib.sha256(str(VERSION).encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in sources() + list(TABLES):
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def dumps(entry):       # entry as the bytes of a cache file
+    with collector_paused():
+        return zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), 1)
+
+
+def loads(data):
+    with collector_paused():
+        return pickle.loads(zlib.decompress(data))
+
+
+class ASTCache:
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = code_version()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, program, options):        # options: the pass settings the tree depends on
+        digest = hashlib.sha256(self.version.encode())
+        digest.update(repr(options).encode())
+        digest.update(program.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key):        # what store() was given under key, or None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = loads(f.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:       # truncated or otherwise unreadable: drop it and parse again
+            self.discard(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)      # most recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def store(self, key, entry):
+        try:
+            data = dumps(entry)
+        except RecursionError:      # too deeply nested to pickle, it just does not get cached
+            return
+        path = self.path(key)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)      # a name no other thread or process is writing
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)      # readers see the whole file or none of it
+        finally:
+            self.discard(temp)      # only still there if writing or replacing failed
+        self.evict()
+
+    def evict(self):        # delete least recently used entries until the directory fits in max_bytes
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:       # evicted by another process meanwhile
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX):
+                    self.discard(entry.path)
@@ -0,0 +1,855 @@
+# My Code
+
+# Closure-compiling engine. Every Element is turned into a Python closure once, with its operands
+# and fields already pulled out of the node, so running a program no longer re-dispatches on
+# elem_type or calls .get() on every evaluation. The closures follow the tree walker in
+# interpreterv4.py exactly (including its error behaviour), they just skip the lookups.
+
+from intbase import ErrorType
+from nil_module import Nil
+from environment import Variable, Frame, qualify, straight_path, descend
+from function import LambdaFcn
+from typecheck import UNCHECKED_OPS, always_accepts, signature
+from resolver import Resolver, block_scope, lookup, needs_scope, bind_arg, compiling
+from inline import inlinable, renamed
+from objects import Object, MemberCache
+
+
+PLAIN_TYPES = ('i', 's', 'b')      # static types of values bound to a parameter without a copy (resolver.PLAIN)
+
+
+def unwrap(val):
+    while isinstance(val, Variable):
+        val = val.get_val()
+    return val
+
+
+def run_steps(steps, fcn, env, args, interp):      # a body from Compiler.compile_body, the way Function.call runs one
+    for is_return, run in steps:
+        if is_return:
+            return run(fcn, env, args)
+        ret_val = run(env)
+        if ret_val is not None:
+            if isinstance(ret_val, ErrorType):
+                return ret_val
+            return fcn.ret(ret_val, interp)
+    return default(fcn, env)
+
+
+def to_str(val):
+    return str(val).lower() if type(val) == bool else str(val)
+
+
+class Compiler:
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.bodies = {}        # id(statements) -> (statements, steps from compile_body). Keeping the statements list alive
+                                # keeps its id from being reused by another list. Resolver.scopes and VM.codes work the same way
+        self.resolver = Resolver()
+        self.inlinable = {}     # Function -> whether calls to it can be compiled into the caller, see inline.py
+
+
+    ### ######### ###
+    ### FUNCTIONS ###
+    ### ######### ###
+
+    def call(self, fcn, args=[]):       # Same as Function.call, but runs the compiled body
+        scope = self.resolver.function(fcn)
+        steps = self.body(fcn, scope)       # before the frame is made, compiling can add slots for inlined calls
+        if type(fcn) is LambdaFcn:      # a lambda keeps its own environment
+            env = fcn.bind(self.interpreter, args)
+        else:
+            env = scope.bind(fcn, args, self.interpreter)
+        if isinstance(env, ErrorType):
+            return env
+
+        # run_steps, written out here: one Python frame less for every Brewin call, which keeps the
+        # closure engine's recursion as deep as the tree walker's
+        for is_return, run in steps:
+            if is_return:
+                return run(fcn, env, args)
+            ret_val = run(env)
+            if ret_val is not None:
+                if isinstance(ret_val, ErrorType):
+                    return ret_val
+                return fcn.ret(ret_val, self.interpreter)
+        return default(fcn, env)
+
+
+    def body(self, fcn, scope):
+        entry = self.bodies.get(id(fcn.statements))
+        if entry is None:
+            with compiling(fcn.name):
+                entry = (fcn.statements, self.compile_body(fcn.name, fcn.statements, scope))
+            self.bodies[id(fcn.statements)] = entry
+        return entry[1]
+
+
+    def compile_body(self, name, statements, scope):       # Top level of a function as (is_return, closure) steps, which call() runs
+        steps = []                                          # the way Function.call runs the statements
+
+        for statement in statements:
+            if statement.elem_type == 'return':
+                steps.append((True, self.compile_top_return(name, statement, scope)))
+                break       # nothing after a top level return can run
+            run = self.compile_statement(statement, scope)
+            if run is not None:
+                steps.append((False, run))
+        return tuple(steps)
+
+
+    def compile_top_return(self, name, statement, scope):
+        interp = self.interpreter
+        val = statement.get('expression')
+
+        if val is None:
+            return lambda fcn, env, args: default(fcn, env)
+
+        if name[-1] == 'f':
+            n = val.get('name')
+            if n is not None and n[:-1] == 'lambda':
+                closure = self.resolver.closure(val, scope)
+
+            def run(fcn, env, args):
+                if n[:-1] == 'lambda':
+                    target = LambdaFcn(None, n, val.get('args'), val.get('statements'))
+                    target.env = closure.capture(env)
+                else:
+                    target = env.retrieve_function(n, interp)
+
+                if isinstance(target, ErrorType):
+                    return target
+
+                return self.call(target, args)
+            return run
+
+        if always_accepts(name, val.static_type):      # Function.ret would hand the value straight back
+            value = self.compile_value(val, scope)
+            return lambda fcn, env, args: value(env)
+
+        expr = self.compile_expression(val, scope)
+
+        def run(fcn, env, args):
+            ret = expr(env)
+            if isinstance(ret, ErrorType):
+                return ret
+            return fcn.ret(ret, interp)
+        return run
+
+
+    ### ########## ###
+    ### STATEMENTS ###
+    ### ########## ###
+
+    def compile_block(self, statements, scope):
+        if not statements:
+            return []
+        block = []
+        for statement in statements:
+            run = self.compile_statement(statement, scope)
+            if run is not None:
+                block.append((run, statement.elem_type == 'return'))
+        return block
+
+
+    def compile_statement(self, statement, scope):      # Returns None for statements that do nothing when run
+        interp = self.interpreter
+
+        match statement.elem_type:
+            case 'vardef' | 'bvardef':
+                kind = "function" if statement.elem_type == 'vardef' else "block"
+                name = str(statement.get('name'))
+
+                own = statement.elem_type == 'bvardef' or scope.level == 0      # a function's frame has no parent for var to go to
+                if own and name[-1] in 'isbof' and name in scope.layout:        # so the name lands in this scope's own slot
+                    level, slot = scope.level, scope.layout[name]
+
+                    def run(env):
+                        values = env.display[level]
+                        if values[slot] is not None:
+                            interp.error(ErrorType.NAME_ERROR, f"Error defining {kind}-scope variable {statement}, probably already declared.")
+                        values[slot] = Variable(env.get_type_signature(name))
+                    return run
+
+                def run(env):
+                    ret = env.define(statement)
+                    if ret:
+                        interp.error(ret, f"Error defining {kind}-scope variable {statement}, probably already declared.")
+                return run
+
+            case '=':
+                return self.compile_assign(statement, scope)
+
+            case 'fcall':
+                call = self.compile_call(statement, scope)
+
+                def run(env):
+                    call(env)
+                return run
+
+            case 'if':
+                return self.compile_if(statement, scope)
+
+            case 'while':
+                return self.compile_while(statement, scope)
+
+            case 'return':
+                val = statement.get('expression')
+                if val is None:
+                    return lambda env: None
+                expr = self.compile_expression(val, scope)
+
+                def run(env):
+                    retrn = expr(env)
+                    if isinstance(retrn, ErrorType):
+                        return interp.error(retrn, f"Error returned from {statement} in environment {env}")
+                    return retrn
+                return run
+
+            case _:
+                return None
+
+
+    def compile_assign(self, statement, scope):
+        interp = self.interpreter
+        var = statement.get('var')
+        expression = statement.get('expression')
+
+        if var[-1] == 'f':
+            exp_name = expression.get('name')
+            if exp_name is None:            # let the tree walker raise whatever it raises here
+                return lambda env: interp.evaluate_statement(statement, env)
+
+            if exp_name[:-1] != 'lambda':
+                def value(env):
+                    return env.retrieve_function(exp_name, interp)
+            else:
+                value = self.compile_expression(expression, scope)
+        else:
+            value = self.compile_expression(expression, scope)
+
+        def fail(ret, exp):
+            interp.error(ret, f"Error assigning {exp} to {var}, probably already declared or incompatible.")
+
+        if '.' in var:
+            path = straight_path(var)
+
+            if path is None:
+                def run(env):
+                    exp = value(env)
+                    ret = env.assign(var, exp, interp)
+                    if isinstance(ret, ErrorType):
+                        fail(ret, exp)
+                return run
+
+            middle, last = path
+            find = self.compile_lookup(qualify(var).segments[0], scope)
+            steps = tuple((segment, MemberCache()) for segment in middle)
+            cache = MemberCache()
+
+            def run(env):       # walks the pre-split path, anything unusual goes through Environment.assign
+                exp = value(env)
+                obj = descend(find(env), steps)
+                if obj is None:
+                    ret = env.assign(var, exp, interp)
+                else:
+                    ret = env.store(obj, last, var, exp, interp, cache.get(obj, last))
+                if isinstance(ret, ErrorType):
+                    fail(ret, exp)
+            return run
+
+        find = self.compile_lookup(var, scope)
+
+        if var[-1] != 'f' and always_accepts(var, expression.static_type):
+            value = self.compile_value(expression, scope)
+
+            def run(env):       # the type check is statically discharged
+                exp = value(env)
+                target = find(env)
+                if target is None:
+                    return fail(ErrorType.NAME_ERROR, exp)
+                target.set_val(exp)
+            return run
+
+        def run(env):           # plain names skip handle_segments, same checks as Environment.assign
+            exp = value(env)
+            target = find(env)
+            if target is None:
+                return fail(ErrorType.NAME_ERROR, exp)
+
+            ac_exp = exp.get_val() if isinstance(exp, Variable) else exp
+            if not env.compare_types(var, ac_exp, interp):
+                return fail(ErrorType.TYPE_ERROR, exp)
+            target.set_val(ac_exp)
+        return run
+
+
+    def compile_scoped(self, statements, scope):        # (compiled block, layout of its environment, or None if it runs in the enclosing one)
+        if not needs_scope(statements):
+            return self.compile_block(statements, scope), None
+        inner = block_scope(scope, statements)
+        return self.compile_block(statements, inner), inner.layout
+
+
+    def compile_if(self, statement, scope):
+        interp = self.interpreter
+        condition = statement.get('condition')
+        true_block, true_layout = self.compile_scoped(statement.get('statements'), scope)
+        else_block, else_layout = self.compile_scoped(statement.get('else_statements'), scope)
+
+        if condition.static_type == 'b':
+            cond = self.compile_value(condition, scope)
+
+            def run(env):
+                if cond(env):
+                    block = Frame(true_layout, env) if true_layout is not None else env
+                    for stmnt, _ in true_block:
+                        ret = stmnt(block)
+                        if ret is not None:
+                            return ret
+                else:
+                    block = Frame(else_layout, env) if else_layout is not None else env
+                    for stmnt, _ in else_block:
+                        ret = stmnt(block)
+                        if ret is not None:
+                            return ret
+            return run
+
+        cond = self.compile_expression(condition, scope)
+
+        def run(env):
+            condition = cond(env)
+            condition = condition.get_val() if isinstance(condition, Variable) else condition
+
+            if (condition != True and condition != False):
+                return interp.error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
+
+            if condition == True:
+                block = Frame(true_layout, env) if true_layout is not None else env
+                for stmnt, _ in true_block:
+                    ret = stmnt(block)
+                    if ret is not None:
+                        return ret
+            else:
+                block = Frame(else_layout, env) if else_layout is not None else env
+                for stmnt, _ in else_block:
+                    ret = stmnt(block)
+                    if ret is not None:
+                        return ret
+        return run
+
+
+    def compile_while(self, statement, scope):
+        interp = self.interpreter
+        cond = self.compile_value(statement.get('condition'), scope)
+        body, layout = self.compile_scoped(statement.get('statements'), scope)
+        blank = [None] * len(layout) if layout is not None else None
+
+        proven = statement.get('condition').static_type == 'b'
+        invariants = statement.invariants or ()
+
+        def run(env):       # evaluates the condition exactly once per iteration
+            for invariant in invariants:
+                invariant.cached = None
+            counts = interp.loop_counts if interp.count_loops else None
+
+            block = Frame(layout, env) if layout is not None else env
+            while True:
+                c = cond(env)
+                if c is not True:
+                    if not proven and (c != True and c != False) and (c != 'true' and c != 'false'):
+                        return interp.error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
+                    if c != True:
+                        break
+                if counts is not None:
+                    counts[statement] = counts.get(statement, 0) + 1
+                if blank:
+                    block.values[:] = blank     # the same as a new environment every iteration
+                for stmnt, is_return in body:
+                    ret = stmnt(block)
+                    if ret is not None:
+                        if isinstance(ret, ErrorType):
+                            interp.error(ret)
+                        return ret
+                    if is_return:
+                        return ret
+        return run
+
+
+    ### ##### ###
+    ### CALLS ###
+    ### ##### ###
+
+    def compile_call(self, statement, scope):       # Mirrors Interpreter.call_function
+        interp = self.interpreter
+        fcn = statement.get('name')
+        raw_args = [self.compile_expression(arg, scope) for arg in statement.get('args')]
+
+        if fcn[-1] == 'f':
+            if '.' in fcn:
+                retrieve = self.compile_retrieve(fcn, scope)
+
+                def find(env):
+                    target = retrieve(env)
+                    if isinstance(target, ErrorType):
+                        interp.error(target)
+                    return target
+            else:
+                lookup_name = self.compile_lookup(fcn, scope)
+
+                def find(env):
+                    target = lookup_name(env)
+                    if target is None:
+                        interp.error(ErrorType.NAME_ERROR)
+                    return target
+
+            def run(env):
+                args = [arg(env) for arg in raw_args]
+                target = unwrap(find(env))
+
+                x = self.call(target, args)
+                if isinstance(x, ErrorType):
+                    interp.error(x)
+                return x
+            return run
+
+        match fcn:
+            case 'print':
+                def run(env):      # each argument is turned into text as soon as it is evaluated
+                    interp.output("".join([to_str(unwrap(arg(env))) for arg in raw_args]))
+                return run
+
+            case 'inputi' | 'inputs':
+                convert = int if fcn == 'inputi' else str
+
+                def run(env):
+                    args = [arg(env) for arg in raw_args]
+                    if len(args) > 1:
+                        interp.error(ErrorType.NAME_ERROR, f"No {fcn}() function found that takes > 1 parameter",)
+                    if len(args) == 1:
+                        interp.output(to_str(unwrap(args[0])))
+                    return convert(interp.get_input())
+                return run
+
+            case _:
+                candidates = interp.overloads.get(fcn, {}).get(len(raw_args), {})      # this site's overloads, by argument types
+                types = signature(statement.get('args'))
+                target = candidates.get(types) if types is not None else None
+
+                if target is not None:      # the argument types are known, so is the function
+                    if interp.inline and not scope.kept and self.can_inline(target):
+                        return self.compile_inline(statement, target, raw_args, scope)
+
+                    def run(env):
+                        x = self.call(target, [arg(env) for arg in raw_args])
+                        if isinstance(x, ErrorType):
+                            interp.error(x)
+                        return x
+                    return run
+
+                def run(env):
+                    args = [arg(env) for arg in raw_args]
+                    target = candidates.get(interp.get_type_signatures(args))
+
+                    if target is None:
+                        interp.error(ErrorType.NAME_ERROR, f"Function {fcn} has not been defined",)
+
+                    x = self.call(target, args)
+                    if isinstance(x, ErrorType):
+                        interp.error(x)
+                    return x
+                return run
+
+
+    def can_inline(self, fcn):
+        found = self.inlinable.get(fcn)
+        if found is None:
+            found = self.inlinable[fcn] = inlinable(fcn)
+        return found
+
+
+    def compile_inline(self, call, target, raw_args, scope):        # A call to target with its body compiled in, see inline.py
+        interp = self.interpreter
+        interp.inlined += 1
+        params, statements = renamed(target, f"{target.name}#{interp.inlined}:")
+
+        for name in params:         # target's names get slots in the caller's environment
+            scope.add(name)
+        unbound = []
+        for statement in statements:
+            if statement.elem_type == 'bvardef':
+                scope.add(statement.get('name'))
+                unbound.append(scope.layout[statement.get('name')])
+        binds = []      # (slot, name, ref, whether the argument's static type always passes the parameter's check)
+        for name, param, arg in zip(params, target.params, call.get('args')):
+            ref = param.get('ref')
+            binds.append((scope.layout[name], name, ref, not ref and arg.static_type in PLAIN_TYPES and always_accepts(name, arg.static_type)))
+        level = scope.level
+        steps = self.compile_body(target.name, statements, scope)
+
+        def run(env):
+            args = [arg(env) for arg in raw_args]
+            values = env.display[level]
+            for slot in unbound:        # unbound again, as in a new environment
+                values[slot] = None
+            for (slot, name, ref, proven), arg in zip(binds, args):
+                if proven:
+                    values[slot] = Variable(arg.get_val() if isinstance(arg, Variable) else arg)
+                    continue
+                bound = bind_arg(env, name, ref, arg, interp)
+                if type(bound) is ErrorType:
+                    interp.error(bound)
+                values[slot] = bound
+
+            x = run_steps(steps, target, env, args, interp)
+            if isinstance(x, ErrorType):
+                interp.error(x)
+            return x
+        return run
+
+
+    ### ########### ###
+    ### EXPRESSIONS ###
+    ### ########### ###
+
+    def compile_lookup(self, name, scope):      # env -> what the plain name is bound to, or None if it is unbound
+        addresses = scope.address(name)
+
+        if len(addresses) == 1:
+            level, slot = addresses[0]
+            return lambda env: env.display[level][slot]
+
+        return lambda env: lookup(env, addresses)
+
+
+    def compile_value(self, expression, scope):        # Like compile_expression, but the result is never a Variable
+        if expression.elem_type == 'qname':
+            interp = self.interpreter
+            name = expression.get('name')
+
+            if '.' not in name:
+                find = self.compile_lookup(name, scope)
+
+                def run(env):           # plain names skip handle_segments, same lookup as Environment.retrieve
+                    ret = find(env)
+                    if ret is None:
+                        interp.error(ErrorType.NAME_ERROR, f"Error retrieving {name}")
+                    while isinstance(ret, Variable):
+                        ret = ret.get_val()
+                    return ret
+                return run
+
+            retrieve = self.compile_retrieve(name, scope)
+
+            def run(env):
+                ret = retrieve(env)
+                if isinstance(ret, ErrorType):
+                    interp.error(ret, f"Error retrieving {name}")
+                while isinstance(ret, Variable):
+                    ret = ret.get_val()
+                return ret
+            return run
+
+        return self.compile_expression(expression, scope)       # only qnames evaluate to Variables
+
+
+    def compile_retrieve(self, name, scope):        # env -> what env.retrieve(name) returns, for dotted names
+        interp = self.interpreter
+        path = straight_path(name)
+        if path is None:
+            return lambda env: env.retrieve(name, interp)
+
+        middle, last = path
+        find = self.compile_lookup(qualify(name).segments[0], scope)
+        steps = tuple((segment, MemberCache()) for segment in middle)
+        cache = MemberCache()
+
+        def run(env):
+            obj = descend(find(env), steps)
+            if obj is not None:
+                if obj.shape is cache.shape:
+                    return obj.slots[cache.slot]
+                member = cache.get(obj, last)
+                if member is not None:
+                    return member
+            return env.retrieve(name, interp)       # off the straight path, errors included
+        return run
+
+
+    def compile_expression(self, expression, scope):
+        interp = self.interpreter
+        expression_type = expression.elem_type
+
+        match expression_type:
+            case 'int' | 'string' | 'bool':
+                val = expression.get('val')
+                return lambda env: val
+
+            case 'nil':
+                return lambda env: Nil
+
+            case '@':
+                shapes = interp.shapes
+                return lambda env: Object(shapes)
+
+            case 'qname':
+                name = expression.get('name')
+
+                if '.' not in name:
+                    find = self.compile_lookup(name, scope)
+
+                    def run(env):
+                        ret = find(env)
+                        if ret is None:
+                            interp.error(ErrorType.NAME_ERROR, f"Error retrieving {name}")
+                        return ret
+                    return run
+
+                retrieve = self.compile_retrieve(name, scope)
+
+                def run(env):
+                    ret = retrieve(env)
+                    if isinstance(ret, ErrorType):
+                        interp.error(ret, f"Error retrieving {name}")
+                    return ret
+                return run
+
+            case 'fcall':
+                return self.compile_call(expression, scope)
+
+            case 'func':
+                if expression.get('name')[:-1] != 'lambda':
+                    return lambda env: None
+                closure = self.resolver.closure(expression, scope)
+
+                def run(env):
+                    fcn = interp.define_function(expression, None, True)
+                    fcn.env = closure.capture(env)
+                    return fcn
+                return run
+
+            case 'invariant':
+                inner = self.compile_expression(expression.get('expr'), scope)
+
+                def run(env):       # worked out once each time its loop starts, see licm.py
+                    val = expression.cached
+                    if val is None:
+                        val = expression.cached = inner(env)
+                    return val
+                return run
+
+            case 'convert':
+                return self.compile_convert(expression, scope)
+
+            case 'neg' | '!':
+                return self.compile_unary(expression, scope)
+
+        if expression.get('op1') is not None and expression.get('op2') is not None:
+            return self.compile_binary(expression, scope)
+
+        return lambda env: None     # nothing else evaluates to anything
+
+
+    def compile_unary(self, expression, scope):
+        interp = self.interpreter
+        op1 = self.compile_value(expression.get('op1'), scope)
+
+        unchecked = UNCHECKED_OPS.get((expression.elem_type, expression.get('op1').static_type))
+        if unchecked is not None:
+            return lambda env: unchecked(op1(env))
+
+        if expression.elem_type == 'neg':
+            def run(env):
+                a = op1(env)
+                if type(a) != int:
+                    interp.error(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation",)
+                return -a
+        else:
+            def run(env):
+                a = op1(env)
+                if type(a) != bool:
+                    interp.error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+                return not a
+        return run
+
+
+    def compile_binary(self, expression, scope):
+        interp = self.interpreter
+        op1 = self.compile_value(expression.get('op1'), scope)
+        op2 = self.compile_value(expression.get('op2'), scope)
+
+        t1 = expression.get('op1').static_type
+        t2 = expression.get('op2').static_type
+        if interp.short_circuit and expression.elem_type in ('&&', '||'):
+            return self.compile_logical(expression.elem_type, op1, op2, t1 == 'b' and t2 == 'b')
+        unchecked = UNCHECKED_OPS.get((expression.elem_type, t1)) if t1 == t2 else None
+        if unchecked is not None:
+            return lambda env: unchecked(op1(env), op2(env))
+
+        def arith_error():
+            interp.error(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation",)
+
+        def bool_error():
+            interp.error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+
+        match expression.elem_type:
+            case '+':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != type(b) or type(a) not in (int, str):
+                        arith_error()
+                    return a + b
+            case '-':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a - b
+            case '*':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a * b
+            case '/':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a // b
+            case '<':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a < b
+            case '<=':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a <= b
+            case '>':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a > b
+            case '>=':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    return a >= b
+            case '==':
+                def run(env):
+                    return equals(op1(env), op2(env))
+            case '!=':
+                def run(env):
+                    return not equals(op1(env), op2(env))
+            case '&&':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != bool or type(b) != bool:
+                        bool_error()
+                    return a and b
+            case '||':
+                def run(env):
+                    a = op1(env)
+                    b = op2(env)
+                    if type(a) != bool or type(b) != bool:
+                        bool_error()
+                    return a or b
+            case _:
+                def run(env):
+                    op1(env)
+                    op2(env)
+        return run
+
+
+    def compile_logical(self, kind, op1, op2, proven):       # Mirrors Interpreter.logical
+        interp = self.interpreter
+
+        if proven:      # both operands are bools, Python's own and/or skip op2 the same way
+            if kind == '&&':
+                return lambda env: op1(env) and op2(env)
+            return lambda env: op1(env) or op2(env)
+
+        decides = kind == '||'      # the value of op1 that makes op2 irrelevant
+
+        def run(env):
+            a = op1(env)
+            if type(a) != bool:
+                interp.error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+            if a == decides:
+                return a
+            b = op2(env)
+            if type(b) != bool:
+                interp.error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+            return b
+        return run
+
+
+    def compile_convert(self, expression, scope):
+        interp = self.interpreter
+        t = expression.get('to_type')
+        expr = self.compile_value(expression.get('expr'), scope)
+
+        def error():
+            interp.error(ErrorType.TYPE_ERROR, f"Incompatible type for conversion (object)")
+
+        def run(env):
+            subject = expr(env)
+            t_expr = type(subject)
+            if t_expr == Object or subject == Nil:
+                error()
+
+            if t == 'str':
+                if t_expr == str or t_expr == int:
+                    return str(subject)
+                if t_expr == bool:
+                    return "true" if subject else "false"
+
+            if t == 'int':
+                if t_expr == str:
+                    try:
+                        return int(subject)
+                    except:
+                        error()
+                if t_expr == int:
+                    return subject
+                if t_expr == bool:
+                    return 1 if subject else 0
+
+            if t == 'bool':
+                if t_expr == str:
+                    return subject != ""
+                if t_expr == int:
+                    return subject != 0
+                if t_expr == bool:
+                    return subject
+        return run
+
+
+def equals(op1, op2):       # Brewin ==: objects by identity, mismatched types are never equal
+    if type(op1) == Object or type(op2) == Object:
+        return op1 is op2
+    if type(op1) != type(op2):
+        return False
+    return op1 == op2
+
+
+def default(fcn, env):      # What a function returns when it runs off the end
+    if fcn.name[-1] == 'v' or fcn.name == 'main':
+        return None
+    return env.get_type_signature(fcn.name)
@@ -1,18 +1,150 @@
+import contextlib
+import gc
+import sys
+import threading
+
+
+class QualifiedName(str):       # a name as written, e.g. "ao.bo.ci", split up once by the parser. Code that keys
+                                # dicts by name converts it back with str(): a dict whose keys are all plain str
+                                # stays on CPython's fast path for them, a str subclass key takes it off
+
+    def __new__(cls, name):
+        self = super().__new__(cls, name)
+        self.segments = tuple(sys.intern(segment) for segment in name.split('.'))
+        self.suffix = name[-1]      # the type character
+        self.dotted = len(self.segments) > 1
+        return self
+
+    def __reduce__(self):       # rebuilt from the text, so the segments are interned again
+        return (QualifiedName, (str(self),))
+
+
+# Fields of every kind of node, in the order brewparse.py passes them. Each kind gets its own Element
+# subclass with exactly these __slots__ (and the ones in EXTRA), so a node is a handful of slots
+# instead of an instance dict plus a dict of fields. A field brewparse.py leaves out reads as None.
+BINARY = ('+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||')
+FIELDS = {
+    'program': ('interfaces', 'functions'),
+    'interface': ('name', 'fields'),
+    'field_func': ('name', 'params'),
+    'field_var': ('name',),
+    'func': ('name', 'args', 'statements'),
+    'arg': ('name', 'ref'),
+    '=': ('var', 'expression'),
+    'vardef': ('name',),
+    'bvardef': ('name',),
+    'if': ('condition', 'statements', 'else_statements'),
+    'while': ('condition', 'statements'),
+    'return': ('expression',),
+    'fcall': ('name', 'args'),
+    'qname': ('name',),
+    'int': ('val',),
+    'bool': ('val',),
+    'string': ('val',),
+    'nil': (),
+    '@': (),
+    'closure': ('args',),
+    '!': ('op1',),
+    'neg': ('op1',),
+    'convert': ('to_type', 'expr'),
+    'invariant': ('expr',),         # made by licm.py
+    **{op: ('op1', 'op2') for op in BINARY},
+}
+EXTRA = {       # state the passes and engines keep on some kinds of node, None until set
+    'if': ('scoped',),                      # whether its blocks need their own environment, see resolver.needs_scope
+    'while': ('scoped', 'invariants'),      # invariants: the 'invariant' nodes licm.py put in it
+    'func': ('captured',),                  # lambdas: names used in the body, see resolver.captured_names
+    'invariant': ('cached',),               # its value since the loop last started
+}
+CLASSES = {}        # elem_type -> its Element subclass
+
+
+def node_class(elem_type, keys=()):     # keys: fields to use for a kind of node FIELDS does not list
+    cls = CLASSES.get(elem_type)
+    if cls is None:
+        fields = FIELDS.get(elem_type, tuple(keys))
+        extra = EXTRA.get(elem_type, ())
+        cls = type(f"Element[{elem_type}]", (Element,), {
+            '__slots__': fields + extra, 'elem_type': elem_type, 'FIELDS': fields, 'EXTRA': extra,
+            '__new__': object.__new__})     # what pickle calls, Element.__new__ picks the class otherwise
+        CLASSES[elem_type] = cls
+        globals()[cls.__name__] = cls       # so pickle finds the class by name, made for all of FIELDS below
+    return cls
+
+
+# A tree is hundreds of thousands of objects, none of them garbage, which would otherwise set off one
+# cyclic collection after another while it is built, pickled or unpickled. The collector is process-wide and
+# several threads may be doing this at once, so it is turned back on when the last of them is done, and
+# only if it was on when the first began.
+PAUSE = threading.Lock()
+paused = 0          # threads inside collector_paused
+resume = False      # whether to enable the collector again when paused drops to 0
+
+
+@contextlib.contextmanager
+def collector_paused():
+    global paused, resume
+    with PAUSE:
+        if paused == 0:
+            resume = gc.isenabled()
+            gc.disable()
+        paused += 1
+    try:
+        yield
+    finally:
+        with PAUSE:
+            paused -= 1
+            if paused == 0 and resume:
+                gc.enable()
+
+
+def maker(elem_type, *fields):      # maker('+', 'op1', 'op2')(a, b) builds what Element('+', op1=a, op2=b) does,
+    cls = node_class(elem_type)         # without the class lookup and the loop over keyword arguments
+    lines = [f"    node.{name} = None" for name in ('static_type',) + cls.EXTRA]
+    lines += [f"    node.{name} = {name}" for name in fields]
+    namespace = {'new': object.__new__, 'cls': cls}
+    exec(f"def make({', '.join(fields)}):\n    node = new(cls)\n" + "\n".join(lines) + "\n    return node", namespace)
+    return namespace['make']
+
+
 class Element:
+    __slots__ = ('static_type',)    # static_type: filled in on expressions by typecheck.TypeChecker
+    FIELDS = ()
+    EXTRA = ()
+
+    def __new__(cls, elem_type, **kwargs):
+        return object.__new__(node_class(elem_type, kwargs))
+
     def __init__(self, elem_type, **kwargs):
-        self.elem_type = elem_type
-        self.dict = {}
+        self.static_type = None
+        for name in self.EXTRA:
+            setattr(self, name, None)
         for key, value in kwargs.items():
-            self.dict[key] = value
+            setattr(self, key, value)
 
     def get(self, key):
-        if key not in self.dict:
-            return None
-        return self.dict[key]
+        return getattr(self, key, None)
+
+    def set(self, key, value):
+        setattr(self, key, value)
+
+    def items(self):        # (field, value) for every field that was given a value
+        for key in self.FIELDS:
+            try:
+                yield key, getattr(self, key)
+            except AttributeError:
+                pass
+
+    def values(self):
+        return (value for _, value in self.items())
+
+    @property
+    def dict(self):         # the fields as a dict, the way nodes used to keep them (plot.py reads it)
+        return dict(self.items())
 
     def __str__(self):
         s = f"{self.elem_type}: "
-        for key, value in self.dict.items():
+        for key, value in self.items():
             s += key + ": " + self.__val(value) + ", "
         return s[0:-2]
 
@@ -27,3 +159,7 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+for _elem_type in FIELDS:       # every class a pickled tree can name exists as soon as this module is imported
+    node_class(_elem_type)
@@ -2,6 +2,42 @@
 
 from intbase import ErrorType
 from nil_module import Nil
+from element import QualifiedName
+from objects import Object
+
+
+def qualify(var):       # names from the parser already are QualifiedNames, anything else is split here
+    return var if type(var) is QualifiedName else QualifiedName(var)
+
+
+def straight_path(var):     # (middle segments, last segment) if handle_segments simply walks var down, else None
+    segments = qualify(var).segments
+    first, last = segments[0], segments[-1]
+    if first == last or first in segments[1:]:
+        return None         # it would search the scopes again part way through
+    end = segments.index(last, 1)       # it stops at the first segment equal to the last one
+    for segment in segments[:end]:
+        if segment[-1] != 'o' and not segment[-1].isupper():
+            return None     # it would fail with a type error
+    return segments[1:end], last
+
+
+def descend(root, steps):       # The object handle_segments ends on, from what the first segment is bound to.
+    prev = root.get_val() if isinstance(root, Variable) else root       # None wherever it would not just step down
+    for segment, cache in steps:        # steps: (segment, MemberCache) for each middle segment
+        if type(prev) is not Object:
+            return None
+        if prev.shape is cache.shape:
+            prev = prev.slots[cache.slot]
+        else:
+            prev = cache.get(prev, segment)
+            if prev is None:
+                return None
+        if isinstance(prev, Variable):
+            prev = prev.get_val()
+    if isinstance(prev, Variable):
+        prev = prev.get_val()
+    return prev if type(prev) is Object else None
 
 class Variable:
 
@@ -54,7 +90,7 @@ class Environment:
         return val
 
     def define(self, statement, isLambda=False):
-        name = statement.get('name')
+        name = str(statement.get('name'))       # see element.QualifiedName
         scope = statement.elem_type
         t = name[-1]
 
@@ -92,12 +128,15 @@ class Environment:
 
     def assign(self, var, exp, caller=None):
 
+        var = qualify(var)
         ret = self.handle_segments(var)
         if isinstance(ret, ErrorType):
             return ret 
         
-        prev = ret[0]
-        cur = ret[1]
+        return self.store(ret[0], ret[1], var, exp, caller)
+
+
+    def store(self, prev, cur, var, exp, caller=None, cell=None):      # the rest of assign, once handle_segments found (prev, cur)
 
         ac_exp = exp
         if isinstance(exp, Variable):
@@ -106,19 +145,23 @@ class Environment:
         if not self.compare_types(cur, ac_exp, caller):
             return ErrorType.TYPE_ERROR  #   REPLACE WITH ERROR OF INVALID TYPES
         
-        if '.' in var and var[-1] == 'f':
+        if var.dotted and var.suffix == 'f':
             from function import Function
             if isinstance(ac_exp, Function):
                 ac_exp.selfo = prev
 
-        if cur not in prev:
+        if cell is None and cur in prev:        # cell: prev[cur], if the caller already has it
+            cell = prev[cur]
+
+        if cell is None:
             prev[cur] = Variable(ac_exp)
         else:
-            prev[cur].set_val(ac_exp)
+            cell.set_val(ac_exp)
 
 
     def retrieve(self, var, caller=None):
         
+        var = qualify(var)
         tup = self.handle_segments(var)
         if isinstance(tup, ErrorType):
             return tup 
@@ -136,7 +179,7 @@ class Environment:
 
     def handle_segments(self, var, exp=None):
 
-        segments = var.split('.')
+        segments = qualify(var).segments
         prev = self.variables
 
         for segment in segments:
@@ -198,7 +241,7 @@ class Environment:
                 if t_val != str:
                     return False    # REPLACE WITH ACTUAL ERROR CALL
             case 'o':
-                if t_val != dict and val is not Nil:
+                if t_val != Object and val is not Nil:
                     return False    # REPLACE WITH ACTUAL ERROR CALL
             case 'f':
                 from function import Function
@@ -228,29 +271,50 @@ class Environment:
         if value == Nil:
             return True
         
-        interface = caller.interface_defs[var_type]     # var_type is a single uppercase char, which would be the name of interface
-
-        for field in interface['variables']:
-            if field not in value:
-                return False
-        
-        for field in interface['functions']:
-            if field not in value:
-                return False
-            # ('here i should check param types')
-
-        return True
+        return caller.implements(value, var_type)      # var_type is a single uppercase char, which would be the name of interface
 
     def retrieve_function(self, name, caller):
-        match = None
-
-        # Prolly need to add handling of segments for object nested function members
-        for key, value in caller.function_defs.items():
-            if key.startswith(name):
-                match = value
-                break
+        # the first function, in definition order, whose key starts with name
+        match = caller.function_prefixes.get(name)
         
         if match == None:
             return ErrorType.NAME_ERROR
         else:
             return match
+
+
+class Slots:        # Dict view over a Frame's slots, for the code that still looks names up by string
+
+    def __init__(self, layout, values):
+        self.layout = layout
+        self.values = values
+
+    def __contains__(self, name):
+        slot = self.layout.get(name)
+        return slot is not None and self.values[slot] is not None
+
+    def __getitem__(self, name):
+        slot = self.layout.get(name)
+        if slot is None or self.values[slot] is None:
+            raise KeyError(name)
+        return self.values[slot]
+
+    def __setitem__(self, name, val):
+        self.values[self.layout[name]] = val
+
+    def items(self):
+        return [(name, self.values[slot]) for name, slot in self.layout.items() if self.values[slot] is not None]
+
+
+class Frame(Environment):       # Environment with a fixed layout (name -> slot) worked out by resolver.py
+
+    def __init__(self, layout, parent=None):
+        self.layout = layout
+        self.values = [None] * len(layout)     # None until the name is defined
+        self.parent = parent
+        # values of every frame from the function's own down to this one, indexed by nesting level
+        self.display = parent.display + (self.values,) if parent is not None else (self.values,)
+
+    @property
+    def variables(self):
+        return Slots(self.layout, self.values)
@@ -0,0 +1,112 @@
+# My Code
+
+# Constant folding, run on the AST between parsing and execution. An operator or conversion whose
+# operands are all literals is worked out once and replaced by the literal it gives, bottom up, so
+# `3 * 4 + 1` becomes `13` and `xi + 3 * 4` becomes `xi + 12`. Only operations that cannot fail are
+# folded: `"a" - 1`, `1 / 0` or `int("x")` stay as they are and still fail when (and if) they run.
+
+from element import Element
+from nil_module import Nil
+from typecheck import UNCHECKED_OPS
+
+LITERALS = {int: 'int', str: 'string', bool: 'bool'}     # type of a folded value -> its literal node
+TYPES = {int: 'i', str: 's', bool: 'b'}                 # the same -> its static type, as UNCHECKED_OPS has them
+
+
+def literal(node):      # (True, value) for a literal node, else (False, None)
+    match node.elem_type:
+        case 'int' | 'string' | 'bool':
+            return True, node.get('val')
+        case 'nil':
+            return True, Nil
+    return False, None
+
+
+def convert(t, subject):        # Same rules as the tree walker's convert case, None where it would fail or give nothing
+    t_expr = type(subject)
+    if t == 'str':
+        if t_expr == str:
+            return subject
+        if t_expr == int:
+            try:
+                return str(subject)
+            except ValueError:      # too many digits
+                return None
+        if t_expr == bool:
+            return "true" if subject else "false"
+    if t == 'int':
+        if t_expr == str:
+            try:
+                return int(subject)
+            except ValueError:
+                return None
+        if t_expr == int:
+            return subject
+        if t_expr == bool:
+            return 1 if subject else 0
+    if t == 'bool':
+        if t_expr == str:
+            return subject != ""
+        if t_expr == int:
+            return subject != 0
+        if t_expr == bool:
+            return subject
+    return None
+
+
+class Folder:
+
+    def __init__(self):
+        self.stats = {}     # elem_type -> how many expressions of that kind were folded away
+
+    def fold(self, node):       # folds everything under node in place, returns what should replace node
+        for key, value in node.items():
+            if isinstance(value, Element):
+                node.set(key, self.fold(value))
+            elif isinstance(value, list):
+                for i, item in enumerate(value):
+                    if isinstance(item, Element):
+                        value[i] = self.fold(item)
+
+        found, val = self.evaluate(node)
+        if not found:
+            return node
+        self.stats[node.elem_type] = self.stats.get(node.elem_type, 0) + 1
+        return Element(LITERALS[type(val)], val=val)
+
+    def evaluate(self, node):       # (True, value) if node is an operation on literals that cannot fail, else (False, None)
+        kind = node.elem_type
+
+        if kind == 'convert':
+            found, subject = literal(node.get('expr'))
+            if found and type(subject) in LITERALS:
+                val = convert(node.get('to_type'), subject)
+                if val is not None:
+                    return True, val
+            return False, None
+
+        if kind in ('neg', '!'):
+            found, a = literal(node.get('op1'))
+            op = UNCHECKED_OPS.get((kind, TYPES.get(type(a))))
+            if found and op is not None:
+                return True, op(a)
+            return False, None
+
+        op1, op2 = node.get('op1'), node.get('op2')
+        if op1 is None or op2 is None:
+            return False, None
+        found1, a = literal(op1)
+        found2, b = literal(op2)
+        if not (found1 and found2):
+            return False, None
+
+        if kind in ('==', '!='):        # any two literals compare, a different type is just unequal
+            same = type(a) == type(b) and a == b
+            return True, same if kind == '==' else not same
+
+        if type(a) != type(b) or type(a) not in TYPES:
+            return False, None
+        op = UNCHECKED_OPS.get((kind, TYPES[type(a)]))
+        if op is None or (kind == '/' and b == 0):
+            return False, None
+        return True, op(a, b)
@@ -3,6 +3,8 @@
 from environment import Environment, Variable, Reference
 from nil_module import Nil
 from intbase import ErrorType
+from objects import Object
+from resolver import captured_names
 import copy
 
 class Function:
@@ -33,47 +35,11 @@ class Function:
 
 
     def call(self, caller, args=[], isLambda=False):
-        if isLambda == True:
-            env = self.env
-        else:
-            env = Environment()
+        env = self.bind(caller, args, isLambda)
+        if isinstance(env, ErrorType):
+            return env
 
         my_type = self.name[-1]
-        if self.selfo is not None:
-            env.variables['selfo'] = self.selfo
-
-        if len(args) != len(self.params):
-            return ErrorType.NAME_ERROR
-        
-        for param, arg in zip(self.params, args):  
-            pName = param.get('name')
-            isRef = param.get('ref')       # True if declared with & and false otherwise
-            
-            eval_arg = arg.get_val() if isinstance(arg, Variable) else arg
-            if not env.compare_types(pName, eval_arg, caller):
-                return ErrorType.TYPE_ERROR
-
-            def_ret = env.define(param, True)
-            if def_ret:
-                return def_ret
-
-            if isRef:
-                if isinstance(arg, Variable):
-                    env.variables[pName] = Reference(arg)
-                else:
-                    temp = Variable(arg)
-                    env.variables[pName] = Reference(temp)
-            else:
-                literal = arg.get_val() if isinstance(arg, Variable) else arg
-
-                if isinstance(literal, dict):
-                    ass_ret = env.assign(pName, literal, caller)
-                else:
-                    ass_ret = env.assign(pName, copy.copy(literal), caller)
-                
-                if ass_ret:
-                    return ass_ret
-
 
             # call function
         for statement in self.statements:
@@ -89,7 +55,7 @@ class Function:
                         n = val.get('name')
 
                         if n[:-1] == 'lambda':
-                            fcn = LambdaFcn(env, n, val.get('args'), val.get('statements'))
+                            fcn = LambdaFcn(env, n, val.get('args'), val.get('statements'), captured_names(val))
                         else:
                             fcn = env.retrieve_function(n, caller)
 
@@ -121,6 +87,50 @@ class Function:
         return t
     
         
+    def bind(self, caller, args=[], isLambda=False, env=None):       # Builds the environment a call runs in, or returns an ErrorType
+        if isLambda == True:
+            env = self.env
+        elif env is None:
+            env = Environment()
+
+        if self.selfo is not None:
+            env.variables['selfo'] = self.selfo
+
+        if len(args) != len(self.params):
+            return ErrorType.NAME_ERROR
+        
+        for param, arg in zip(self.params, args):  
+            pName = param.get('name')
+            isRef = param.get('ref')       # True if declared with & and false otherwise
+            
+            eval_arg = arg.get_val() if isinstance(arg, Variable) else arg
+            if not env.compare_types(pName, eval_arg, caller):
+                return ErrorType.TYPE_ERROR
+
+            def_ret = env.define(param, True)
+            if def_ret:
+                return def_ret
+
+            if isRef:
+                if isinstance(arg, Variable):
+                    env.variables[pName] = Reference(arg)
+                else:
+                    temp = Variable(arg)
+                    env.variables[pName] = Reference(temp)
+            else:
+                literal = arg.get_val() if isinstance(arg, Variable) else arg
+
+                if isinstance(literal, Object):
+                    ass_ret = env.assign(pName, literal, caller)
+                else:
+                    ass_ret = env.assign(pName, copy.copy(literal), caller)
+                
+                if ass_ret:
+                    return ass_ret
+
+        return env
+
+
     def ret(self, val, caller=None):
 
         t_val = self.name[-1]
@@ -145,7 +155,7 @@ class Function:
                 if type(literal) != str:
                     return ErrorType.TYPE_ERROR
             case 'o':
-                if type(literal) != dict and literal is not Nil:
+                if type(literal) != Object and literal is not Nil:
                     return ErrorType.TYPE_ERROR
             case 'b':
                 if type(literal) != bool:
@@ -154,7 +164,7 @@ class Function:
                 if not isinstance(literal, Function):
                     return ErrorType.TYPE_ERROR
             case _:
-                if t_val.isupper() and (type(literal) is dict or literal is Nil):
+                if t_val.isupper() and (type(literal) is Object or literal is Nil):
                     if self.check_interface_compatibility(self.name, literal, caller) == True:
                         return literal
                 return ErrorType.TYPE_ERROR
@@ -175,18 +185,7 @@ class Function:
         if value == Nil:
             return True
         
-        interface = caller.interface_defs[var_type]     # var_type is a single uppercase char, which would be the name of interface
-
-        for field in interface['variables']:
-            if field not in value:
-                return False
-        
-        for field in interface['functions']:
-            if field not in value:
-                return False
-            # ('here i should check param types')
-
-        return True
+        return caller.implements(value, var_type)      # var_type is a single uppercase char, which would be the name of interface
 
 
 ### ###### ###
@@ -196,16 +195,24 @@ class Function:
 
 class LambdaFcn(Function):
 
-    def __init__(self, closure, name, params=[], statements=[]):
+    def __init__(self, closure, name, params=[], statements=[], captured=None):
         super().__init__(name, params, statements)
         self.env = Environment()
 
 
-        self.env.variables = self.populate(closure)
+        self.env.variables = self.populate(closure, captured)
     
 
-    def populate(self, closure):
+    def populate(self, closure, captured=None):        # captured: the only names the body uses, None for all of them
         vars = {}
+
+        if captured is not None and closure:
+            for n in captured:
+                scope = closure.search_scopes(n)
+                if scope is not None:
+                    vars[n] = copy.copy(scope[n])
+            return vars
+
         current = closure
 
         while current:
@@ -217,4 +224,7 @@ class LambdaFcn(Function):
         return vars
 
     def call(self, caller, args=[], isLamba=True):
-        return super().call(caller, args, isLambda=True)
\ No newline at end of file
+        return super().call(caller, args, isLambda=True)
+
+    def bind(self, caller, args=[], isLambda=True, env=None):      # always runs in its own self.env
+        return super().bind(caller, args, isLambda=True)
\ No newline at end of file
@@ -0,0 +1,115 @@
+# My Code
+
+# Inlining for the closure engine. A call whose target is known at compile time can have the
+# target's body compiled straight into the caller instead of calling it, when that body is small and
+# calls nothing but the builtins (so it cannot end up calling itself). The body is copied with every
+# name renamed to one no other code uses, and those names get slots in the caller's environment.
+# Arguments are still checked, copied or passed by reference exactly as Function.bind would, and the
+# result is still checked the way Function.ret would, so only the call itself goes away.
+
+from element import Element, QualifiedName
+from environment import qualify, straight_path
+from function import LambdaFcn
+
+MAX_STATEMENTS = 3      # size heuristic: longest body that is inlined...
+MAX_NODES = 30          # ... and the most AST nodes it may have
+BUILTINS = ('print', 'inputi', 'inputs')
+TYPES = ('i', 's', 'b', 'o', 'f')       # valid name suffixes, besides an interface's capital
+
+
+def inlinable(fcn):     # True if every call to fcn can run its body in the caller's environment
+    if type(fcn) is LambdaFcn or fcn.name == 'main' or fcn.name[-1] == 'f':     # f: a top level return calls on
+        return False
+    statements = fcn.statements or []
+    if len(statements) > MAX_STATEMENTS or size(statements) > MAX_NODES:
+        return False
+
+    names = set()       # names defined in the body so far: parameters, then its vars
+    for param in fcn.params:
+        name = param.get('name')
+        if name in names or not valid(name):
+            return False
+        names.add(name)
+
+    for i, statement in enumerate(statements):
+        match statement.elem_type:
+            case 'vardef' | 'bvardef':      # with no parent environment both simply define the name
+                name = statement.get('name')
+                if name in names or not valid(name):
+                    return False        # leave the error it gives to a real call
+                names.add(name)
+            case '=':
+                var = qualify(statement.get('var'))
+                if var.suffix == 'f' or not known(var, names):
+                    return False
+                if not expression(statement.get('expression'), names):
+                    return False
+            case 'fcall':
+                if not expression(statement, names):
+                    return False
+            case 'return':
+                if i != len(statements) - 1:
+                    return False
+                val = statement.get('expression')
+                if val is not None and not expression(val, names):
+                    return False
+            case _:
+                return False
+    return True
+
+
+def valid(name):
+    return name[-1] in TYPES or name[-1].isupper()
+
+
+def known(name, names):     # a name the body can only find among its own, on a path handle_segments just walks down
+    return name.segments[0] in names and (not name.dotted or straight_path(name) is not None)
+
+
+def expression(node, names):
+    match node.elem_type:
+        case 'int' | 'string' | 'bool' | 'nil' | '@':
+            return True
+        case 'qname':
+            return known(qualify(node.get('name')), names)
+        case 'fcall':
+            return node.get('name') in BUILTINS and all(expression(arg, names) for arg in node.get('args'))
+        case 'func':
+            return False
+        case 'convert':
+            return expression(node.get('expr'), names)
+    operands = [node.get(key) for key in ('op1', 'op2') if node.get(key) is not None]
+    return bool(operands) and all(expression(op, names) for op in operands)
+
+
+def size(value):
+    if isinstance(value, list):
+        return sum(size(item) for item in value)
+    if isinstance(value, Element):
+        return 1 + sum(size(item) for item in value.values())
+    return 0
+
+
+def renamed(fcn, tag):      # (parameter names, copy of fcn's body) with every name given tag in front of it
+    names = {param.get('name') for param in fcn.params}
+    names.update(statement.get('name') for statement in fcn.statements if statement.elem_type in ('vardef', 'bvardef'))
+    params = [tag + param.get('name') for param in fcn.params]
+    return params, [rename(statement, names, tag) for statement in fcn.statements]
+
+
+def rename(node, names, tag):
+    if isinstance(node, list):
+        return [rename(item, names, tag) for item in node]
+    if not isinstance(node, Element):
+        return node
+
+    elem_type = 'bvardef' if node.elem_type == 'vardef' else node.elem_type     # the caller's environment may have a parent
+    copy = Element(elem_type)
+    for key, value in node.items():
+        if key in ('name', 'var') and node.elem_type in ('qname', 'vardef', 'bvardef', '='):
+            name = qualify(value)
+            if name.segments[0] in names:
+                value = QualifiedName(tag + name)
+        copy.set(key, rename(value, names, tag))
+    copy.static_type = node.static_type
+    return copy
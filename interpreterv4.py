@@ -2,29 +2,114 @@
 
 from intbase import InterpreterBase
 from intbase import ErrorType
-import copy
-from nil_module import Nil
+from nil_module import Nil, NilClass
 from function import Function, LambdaFcn
 from environment import Environment, Variable
-from brewparse import parse_program
+from resolver import needs_scope, captured_names, NestingError
+from compiler import Compiler
+from vm import VM
+from typecheck import TypeChecker
+from cache import ASTCache, loads
+from pipeline import compile_program
+from objects import Object, Shape
+
+
+TYPE_CHARS = {str: 's', int: 'i', bool: 'b', Object: 'o', NilClass: 'o'}      # argument type -> its char in function keys
+NO_OVERLOADS = {}
 
 
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    ENGINES = ('tree', 'closure', 'vm')     # tree walks the AST directly, closure compiles it to closures first (compiler.py),
+                                            # vm lowers it to bytecode and runs that on its own frame stack (vm.py)
+
+    MAX_DEPTH = 100000      # Brewin calls the vm lets nest by default
+
+    def __init__(self, console_output=True, inp=None, trace_output=False, engine='tree', typecheck=False, max_depth=MAX_DEPTH,
+                 fold=True, licm=True, inline=True, count_loops=False, short_circuit=False,
+                 cache_dir=None):
         super().__init__(console_output, inp)   # call InterpreterBase's constructor
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {self.ENGINES}")
+        self.engine = engine
+        self.typecheck = typecheck      # True: reject programs with operations that are certain to fail before running them
+        self.type_errors = []
+        self.max_depth = max_depth      # vm: calls nested deeper than this are a STACK_ERROR rather than using more memory
+        self.fold = fold                # fold operations on literals before running (fold.py)
+        self.fold_stats = {}            # what the last run folded: expression kind -> count
+        self.licm = licm                # work out loop-invariant expressions once per loop (licm.py)
+        self.hoisted = 0                # how many the last run found
+        self.inline = inline            # closure: compile small functions into their callers (inline.py)
+        self.inlined = 0                # call sites the last run did that for
+        self.count_loops = count_loops  # count the iterations of every while loop, for profiling
+        self.loop_counts = {}           # what the last run counted: while node -> iterations run
+        self.short_circuit = short_circuit  # && and || skip their right operand when the left one decides. Off by default,
+                                            # which evaluates both as the test suite expects
+        self.cache = ASTCache(cache_dir) if cache_dir is not None else None     # parsed programs kept on disk (cache.py)
         self.function_defs = {}
+        self.overloads = {}             # lookup tables over function_defs, see index_functions
+        self.function_prefixes = {}
         self.interface_defs = {}        # Access by interface name. has variables and functions fields. variables is list [] and functions
                                         # ... is a dictionary that maps fcn names to list of args.: x =  _defs[A]["functions"]["foof"][0] wld produce the first arg of foof
+        self.shapes = Shape()           # shape of an empty object, every object of a run starts from it
+        self.interface_hits = 0         # interface checks answered from the per-shape cache, and ones worked out
+        self.interface_misses = 0
 
     def run(self, program): # {
-        ast = parse_program(program)
+        self.execute(self.parse(program))
+    # }
+
+    def run_compiled(self, data):       # a program batch.compile_files gave, folded and hoisted as it was told to
+        ast, self.fold_stats, self.hoisted, messages = loads(data)
+        for message in messages:        # what parsing it reported, as run would have printed it
+            print(message)
+        self.execute(ast)
+
+    def execute(self, ast): # {
+        self.shapes = Shape()
+        self.inlined = 0
+        self.loop_counts = {}
+        self.interface_hits = 0
+        self.interface_misses = 0
         self.define_interfaces(ast)
         main = self.get_main_node(ast)
-        x = main.call(self)
+
+        if self.typecheck or self.engine != 'tree':     # the compiled engines use the static types to skip checks
+            self.type_errors = TypeChecker(self, strict=self.typecheck).check(ast)
+
+        try:
+            match self.engine:
+                case 'closure':
+                    x = Compiler(self).call(main)
+                case 'vm':
+                    x = VM(self).run(main)
+                case _:
+                    x = main.call(self)
+        except NestingError:        # too deeply nested to compile, which no call depth would change
+            raise
+        except RecursionError:      # tree and closure nest Python calls for Brewin calls, the vm does not
+            super().error(ErrorType.STACK_ERROR, f"Too many nested calls for the {self.engine} engine, the vm engine runs up to {self.max_depth}")
+
         if isinstance(x, ErrorType):
             super().error(x, f"Error returning from main")
     # }
 
+    def parse(self, program):      # program's tree, folded and hoisted, loaded from self.cache if it has it
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(program, (self.fold, self.licm))
+            entry = self.cache.load(key)
+            if entry is not None:
+                ast, self.fold_stats, self.hoisted, messages = entry
+                for message in messages:        # the syntax errors recovered from, printed as a cold run would
+                    print(message)
+                return ast
+
+        entry = compile_program(program, self.fold, self.licm)
+        if key is not None:
+            self.cache.store(key, entry)
+        ast, self.fold_stats, self.hoisted, _ = entry
+        return ast
+
 
     def define_interfaces(self, tree):
         if tree.elem_type == 'program':
@@ -56,6 +141,34 @@ class Interpreter(InterpreterBase):
                 
 
 
+    def implements(self, value, name):      # Does value have every member interface name lists? Cached on the object's shape
+        if type(value) is not Object:
+            return self.has_members(value, self.interface_defs[name])
+
+        shape = value.shape
+        if name in shape.interfaces:
+            self.interface_hits += 1
+            return shape.interfaces[name]
+
+        self.interface_misses += 1
+        result = self.has_members(value, self.interface_defs[name])
+        shape.interfaces[name] = result
+        return result
+
+
+    def has_members(self, value, interface):
+        for field in interface['variables']:
+            if field not in value:
+                return False
+
+        for field in interface['functions']:
+            if field not in value:
+                return False
+            # ('here i should check param types')
+
+        return True
+
+
     def get_main_node(self, tree): # {          # Maps all functions to name and arg types: fooib, boos
         if tree.elem_type == 'program':
             functions = tree.get('functions')
@@ -68,6 +181,8 @@ class Interpreter(InterpreterBase):
                     super().error(ErrorType.NAME_ERROR, f"Cannot declare function twice")
 
                 self.function_defs[key] = fcn
+
+            self.index_functions()
             
             if "main" in self.function_defs:
                 return self.function_defs["main"]
@@ -75,6 +190,18 @@ class Interpreter(InterpreterBase):
             super().error(ErrorType.NAME_ERROR, "No main() function was found",)
     # }
     
+    def index_functions(self):      # Lookup tables over function_defs, so calls and function references skip building keys and scanning
+        self.overloads = {}             # name -> arity -> tuple of argument type chars -> Function
+        self.function_prefixes = {}     # every prefix of every key -> the first function, in definition order, whose key starts with it
+        for key, fcn in self.function_defs.items():
+            types = tuple(key[len(fcn.name):])
+            self.overloads.setdefault(str(fcn.name), {}).setdefault(len(types), {})[types] = fcn
+            for end in range(len(key) + 1):
+                self.function_prefixes.setdefault(key[:end], fcn)
+
+    def overload(self, name, types):       # the function a call of name with arguments of these type chars runs, or None
+        return self.overloads.get(name, NO_OVERLOADS).get(len(types), NO_OVERLOADS).get(types)
+
     def define_function(self, function, env=None, isLambda=False):
         name = function.get('name')
         args = function.get('args')
@@ -92,7 +219,7 @@ class Interpreter(InterpreterBase):
         if t != 's' and t != 'i' and t != 'b' and t != 'o' and t != 'v' and t != 'f' and name != 'main' and not t.isupper():
             super().error(ErrorType.TYPE_ERROR, "invalid function type",)
 
-        result = LambdaFcn(env, name, args, stmnts) if isLambda else Function(name, args, stmnts)
+        result = LambdaFcn(env, name, args, stmnts, captured_names(function)) if isLambda else Function(name, args, stmnts)
         return result
 
 
@@ -113,7 +240,7 @@ class Interpreter(InterpreterBase):
 
                 var = statement.get('var')
 
-                if var[-1] == 'f':
+                if var.suffix == 'f':
                     exp_name = statement.get('expression').get('name')
                     if exp_name[:-1] != 'lambda':
                         exp = env.retrieve_function(exp_name, self)
@@ -150,19 +277,20 @@ class Interpreter(InterpreterBase):
 
         args = []
         args_str = ""
+        shown = fcn == 'print' or fcn == 'inputi' or fcn == 'inputs'     # only the output builtins need the text of their args
 
         for arg in raw_args:
             argument = self.evaluate_expression(arg, env)
             args.append(argument)
 
-            i = copy.deepcopy(argument)
-            while isinstance(i, Variable):
-                i = i.get_val()
-            x = lambda s: str(s).lower() if type(s) == bool else str(s)
-            args_str += x(i)
+            if shown:       # as the argument is now, later arguments may still change it
+                i = argument
+                while isinstance(i, Variable):
+                    i = i.get_val()
+                args_str += str(i).lower() if type(i) == bool else str(i)
 
 
-        if fcn[-1] == 'f':
+        if fcn.suffix == 'f':
 
             fcn = env.retrieve(fcn)
             if isinstance(fcn, ErrorType):
@@ -204,10 +332,10 @@ class Interpreter(InterpreterBase):
 
             case _:
                 ts = self.get_type_signatures(args)
-                key = f"{fcn}{ts}"
+                target = self.overload(fcn, ts)
 
-                if key in self.function_defs:
-                    x = self.function_defs[key].call(self, args)
+                if target is not None:
+                    x = target.call(self, args)
                     if isinstance(x, ErrorType):
                         super().error(x)
                     else:
@@ -229,7 +357,10 @@ class Interpreter(InterpreterBase):
         if (condition != True and condition != False):
             return super().error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
 
-        block = Environment(env)
+        scoped = statement.scoped
+        if scoped is None:
+            scoped = statement.scoped = needs_scope(true_stmnts, else_stmnts)
+        block = Environment(env) if scoped else env
 
         if condition == True:
             if true_stmnts:
@@ -248,15 +379,29 @@ class Interpreter(InterpreterBase):
     def call_while(self, statement, env):
         condition = statement.get('condition')
         stmnts = statement.get('statements')
-
-        cond = self.evaluate_expression(condition, env)
-        cond = cond.get_val() if isinstance(cond, Variable) else cond
-
-        if (cond != True and cond != False) and (cond != 'true' and cond != 'false'):
-            return super().error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
-        
-        while(self.evaluate_expression(condition, env) == True):
-            block = Environment(env)
+        for invariant in statement.invariants or ():
+            invariant.cached = None
+
+        counts = self.loop_counts if self.count_loops else None
+
+        scoped = statement.scoped
+        if scoped is None:
+            scoped = statement.scoped = needs_scope(stmnts)
+        block = Environment(env) if scoped else env
+
+        while True:         # the condition is evaluated exactly once per iteration
+            cond = self.evaluate_expression(condition, env)
+            if cond is not True:
+                while isinstance(cond, Variable):
+                    cond = cond.get_val()
+                if (cond != True and cond != False) and (cond != 'true' and cond != 'false'):
+                    return super().error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
+                if cond != True:
+                    break
+            if counts is not None:
+                counts[statement] = counts.get(statement, 0) + 1
+            if scoped:
+                block.variables.clear()     # the same as a new environment every iteration
             if stmnts:
                 for stmnt in stmnts:
                     ret = self.evaluate_statement(stmnt, block)
@@ -280,33 +425,44 @@ class Interpreter(InterpreterBase):
             return retrn
         
 
-    def get_type_signatures(self, xs):
-        typeSignatures = ""
+    def logical(self, expression, env):     # && and || when short_circuit is on: op2 only runs if op1 does not decide
+        op1 = self.evaluate_expression(expression.get('op1'), env)
+        while isinstance(op1, Variable):
+            op1 = op1.get_val()
+        if type(op1) != bool:
+            return super().error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+        if op1 == (expression.elem_type == '||'):
+            return op1
+
+        op2 = self.evaluate_expression(expression.get('op2'), env)
+        while isinstance(op2, Variable):
+            op2 = op2.get_val()
+        if type(op2) != bool:
+            return super().error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+        return op2
+
+
+    def get_type_signatures(self, xs):      # tuple of the type chars function keys use, one per argument
+        typeSignatures = []
 
         for x in xs:
             
             if isinstance(x, Variable):
                 x = x.get_val()
 
-            if type(x) == str:
-                typeSignatures += 's'
-            elif type(x) == int:
-                typeSignatures += 'i'
-            elif type(x) == bool:
-                typeSignatures += 'b'
-            elif type(x) == dict:
-                typeSignatures += 'o'
-            elif x == Nil:
-                typeSignatures += 'o'
-            else:
+            t = TYPE_CHARS.get(type(x))
+            if t is None:
                 return super().error(ErrorType.TYPE_ERROR)
-            # Maybe add error for if the type signature isn't s/i/b/o, then type error?
-        return typeSignatures
+            typeSignatures.append(t)
+        return tuple(typeSignatures)
 
 
     def evaluate_expression(self, expression, env): # {
         expression_type = expression.elem_type
 
+        if self.short_circuit and (expression_type == '&&' or expression_type == '||'):
+            return self.logical(expression, env)
+
         if expression.get('op1') != None:
             op1 = self.evaluate_expression(expression.get('op1'), env)
             if op1:
@@ -369,7 +525,7 @@ class Interpreter(InterpreterBase):
                 return op1 // op2
             
             case '==':
-                if type(op1) == dict or type(op2) == dict:
+                if type(op1) == Object or type(op2) == Object:
                     if op1 is op2:
                         return True
                     else:
@@ -384,7 +540,7 @@ class Interpreter(InterpreterBase):
             
             case '!=':
 
-                if type(op1) == dict or type(op2) == dict:
+                if type(op1) == Object or type(op2) == Object:
                     if op1 is op2:
                         return False
                     else:
@@ -471,7 +627,7 @@ class Interpreter(InterpreterBase):
                 return val
             
             case '@':
-                return {}
+                return Object(self.shapes)
             
             case 'nil':
                 return Nil
@@ -482,6 +638,11 @@ class Interpreter(InterpreterBase):
                     lamb = self.define_function(expression, env, True)
                     return lamb
 
+            case 'invariant':
+                if expression.cached is None:
+                    expression.cached = self.evaluate_expression(expression.get('expr'), env)
+                return expression.cached
+
             case 'convert':
                 t = expression.get('to_type')
                 subject = self.evaluate_expression(expression.get('expr'), env)
@@ -490,7 +651,7 @@ class Interpreter(InterpreterBase):
                     subject = subject.get_val()
                 
                 t_expr = type(subject)
-                if t_expr == dict or subject == Nil:
+                if t_expr == Object or subject == Nil:
                     super().error(ErrorType.TYPE_ERROR, f"Incompatible type for conversion (object)")
                 
                 if t == 'str':
@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AMP', 'AND', 'ASSIGN', 'AT', 'BOOL', 'BVAR', 'CLOSURE', 'COMMA', 'DEF', 'DIVIDE', 'DOT', 'ELSE', 'EQ', 'FALSE', 'GREATER', 'GREATER_EQ', 'IF', 'INT', 'INTERFACE', 'LAMBDA', 'LBRACE', 'LESS', 'LESS_EQ', 'LPAREN', 'MINUS', 'MULTIPLY', 'NAME', 'NIL', 'NOT', 'NOT_EQ', 'NUMBER', 'OR', 'PLUS', 'RBRACE', 'RETURN', 'RPAREN', 'SEMI', 'STR', 'STRING', 'TRUE', 'VAR', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = '=+-*/(),{};><".!@&'
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NUMBER>\\d+)|(?P<t_LAMBDA>lambda[bifosvA-Z]\\b)|(?P<t_NAME>[A-Za-z_][\\w_]*)|(?P<t_newline>\\n+)|(?P<t_comment>/\\*(.|\\n)*?\\*/)|(?P<t_STRING>".*?")|(?P<t_OR>\\|\\|)|(?P<t_AND>&&)|(?P<t_DOT>\\.)|(?P<t_EQ>==)|(?P<t_GREATER_EQ>>=)|(?P<t_LBRACE>\\{)|(?P<t_LESS_EQ><=)|(?P<t_LPAREN>\\()|(?P<t_MINUS>\\-)|(?P<t_MULTIPLY>\\*)|(?P<t_NOT_EQ>!=)|(?P<t_PLUS>\\+)|(?P<t_RBRACE>\\})|(?P<t_RPAREN>\\))|(?P<t_AMP>&)|(?P<t_ASSIGN>=)|(?P<t_AT>@)|(?P<t_COMMA>,)|(?P<t_DIVIDE>/)|(?P<t_GREATER>>)|(?P<t_LESS><)|(?P<t_NOT>!)|(?P<t_SEMI>;)', [None, ('t_NUMBER', 'NUMBER'), ('t_LAMBDA', 'LAMBDA'), ('t_NAME', 'NAME'), ('t_newline', 'newline'), ('t_comment', 'comment'), None, ('t_STRING', 'STRING'), (None, 'OR'), (None, 'AND'), (None, 'DOT'), (None, 'EQ'), (None, 'GREATER_EQ'), (None, 'LBRACE'), (None, 'LESS_EQ'), (None, 'LPAREN'), (None, 'MINUS'), (None, 'MULTIPLY'), (None, 'NOT_EQ'), (None, 'PLUS'), (None, 'RBRACE'), (None, 'RPAREN'), (None, 'AMP'), (None, 'ASSIGN'), (None, 'AT'), (None, 'COMMA'), (None, 'DIVIDE'), (None, 'GREATER'), (None, 'LESS'), (None, 'NOT'), (None, 'SEMI')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -0,0 +1,143 @@
+# My Code
+
+# Loop-invariant code motion. In a while loop that calls nothing but the builtins, an operation whose
+# operands are literals and names the loop never assigns or declares gives the same value every time
+# it runs. Such an expression is wrapped in an 'invariant' node that works it out the first time it
+# runs after the loop is entered and hands back that value from then on. Nothing actually moves ahead
+# of the loop, so the expression still runs, and fails, exactly where it first ran before.
+#
+# Member reads (ao.xi) only count as invariant in loops that assign no members at all, as any member
+# assignment could be to the same object through another name. The same goes for & parameters: two of
+# them can be bound to one variable, so a parameter passed by reference only counts as invariant in
+# loops that assign no parameter passed by reference.
+
+from element import Element
+from environment import qualify
+
+OPERATIONS = ('+', '-', '*', '/', '<', '<=', '>', '>=', '==', '!=', '&&', '||', 'neg', '!', 'convert')
+BUILTINS = ('print', 'inputi', 'inputs')        # calls that cannot change any variable or member
+
+
+class Effects:      # what running a loop can change
+
+    def __init__(self):
+        self.names = set()          # names assigned or declared in it (first segments, or every segment of a member assignment)
+        self.members = False        # whether it assigns members
+        self.calls = False          # whether it calls anything but the builtins
+        self.references = frozenset()       # the & parameters of the function it is in, and of the ones around a lambda
+
+
+class Hoister:
+
+    def __init__(self):
+        self.hoisted = 0        # invariant expressions found
+
+    def hoist(self, node, references=frozenset()):      # every loop under node, outer loops first
+        if node.elem_type == 'func':
+            references = references | {arg.get('name') for arg in node.get('args') if arg.get('ref')}
+        if node.elem_type == 'while':
+            effects = Effects()
+            effects.references = references
+            self.scan(node, effects)
+            if not effects.calls:
+                node.set('condition', self.wrap(node.get('condition'), node, effects))
+                self.statements(node.get('statements'), node, effects)
+
+        for value in node.values():
+            if isinstance(value, Element):
+                self.hoist(value, references)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Element):
+                        self.hoist(item, references)
+
+    def scan(self, node, effects):
+        match node.elem_type:
+            case '=':
+                segments = qualify(node.get('var')).segments
+                effects.names.update(segments)      # a member assignment can overwrite a variable, see handle_segments
+                if len(segments) > 1:
+                    effects.members = True
+            case 'vardef' | 'bvardef':
+                effects.names.add(node.get('name'))
+            case 'fcall':
+                if node.get('name') not in BUILTINS:
+                    effects.calls = True
+
+        for value in node.values():
+            if isinstance(value, Element):
+                self.scan(value, effects)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Element):
+                        self.scan(item, effects)
+
+    def statements(self, statements, loop, effects):
+        for statement in statements or []:
+            match statement.elem_type:
+                case '=':
+                    if qualify(statement.get('var')).suffix != 'f':     # a function assignment looks at its right side by name
+                        statement.set('expression', self.wrap(statement.get('expression'), loop, effects))
+                case 'fcall':
+                    self.arguments(statement, loop, effects)
+                case 'return':
+                    if statement.get('expression') is not None:
+                        statement.set('expression', self.wrap(statement.get('expression'), loop, effects))
+                case 'if':
+                    statement.set('condition', self.wrap(statement.get('condition'), loop, effects))
+                    self.statements(statement.get('statements'), loop, effects)
+                    self.statements(statement.get('else_statements'), loop, effects)
+                case 'while':
+                    statement.set('condition', self.wrap(statement.get('condition'), loop, effects))
+                    self.statements(statement.get('statements'), loop, effects)
+
+    def arguments(self, call, loop, effects):
+        args = call.get('args')
+        for i, arg in enumerate(args):
+            args[i] = self.wrap(arg, loop, effects)
+
+    def wrap(self, expression, loop, effects):      # expression, or what should replace it
+        if expression.elem_type in OPERATIONS and self.invariant(expression, effects) and self.reads(expression):
+            node = Element('invariant', expr=expression)
+            if not loop.invariants:
+                loop.invariants = []
+            loop.invariants.append(node)
+            self.hoisted += 1
+            return node
+
+        match expression.elem_type:
+            case 'fcall':
+                self.arguments(expression, loop, effects)
+            case 'convert':
+                expression.set('expr', self.wrap(expression.get('expr'), loop, effects))
+            case _:
+                for key in ('op1', 'op2'):
+                    if expression.get(key) is not None:
+                        expression.set(key, self.wrap(expression.get(key), loop, effects))
+        return expression       # lambda bodies are left alone, they can run after the loop
+
+    def invariant(self, expression, effects):
+        match expression.elem_type:
+            case 'int' | 'string' | 'bool' | 'nil' | 'invariant':
+                return True
+            case 'qname':
+                segments = qualify(expression.get('name')).segments
+                if len(segments) > 1 and effects.members:
+                    return False
+                if segments[0] in effects.references and not effects.names.isdisjoint(effects.references):
+                    return False        # possibly the same variable as one the loop assigns
+                return not any(segment in effects.names for segment in segments)
+            case 'convert':
+                return self.invariant(expression.get('expr'), effects)
+            case kind if kind in OPERATIONS:
+                return all(self.invariant(expression.get(key), effects)
+                           for key in ('op1', 'op2') if expression.get(key) is not None)
+        return False
+
+    def reads(self, expression):        # whether expression reads a name, rather than just combine literals
+        match expression.elem_type:
+            case 'qname' | 'invariant':
+                return True
+            case 'convert':
+                return self.reads(expression.get('expr'))
+        return any(self.reads(expression.get(key)) for key in ('op1', 'op2') if expression.get(key) is not None)
@@ -0,0 +1,86 @@
+# My Code
+
+# Brewin objects. An object keeps its members in a plain list, and which member sits at which index
+# is described by its Shape. Objects that gained the same members in the same order share a Shape:
+# every shape remembers the shape it turns into when a given member is added, so the shapes of a
+# run form a tree rooted at the empty shape. A member access site can then remember the last shape
+# it saw and where the member sits in it (MemberCache), and skip the lookup the next time.
+
+import copy
+
+
+class Shape:
+
+    def __init__(self, fields=()):
+        self.fields = fields        # member names, in slot order
+        self.index = {name: slot for slot, name in enumerate(fields)}
+        self.transitions = {}       # member name -> the shape with that member added
+        self.interfaces = {}        # interface name -> whether objects of this shape have all its members
+
+    def add(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = Shape(self.fields + (name,))
+            self.transitions[name] = shape
+        return shape
+
+
+class Object:
+    __slots__ = ('shape', 'slots')
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.slots = []
+
+    def __contains__(self, name):
+        return name in self.shape.index
+
+    def __getitem__(self, name):
+        return self.slots[self.shape.index[name]]
+
+    def __setitem__(self, name, val):
+        slot = self.shape.index.get(name)
+        if slot is None:
+            self.shape = self.shape.add(name)
+            self.slots.append(val)
+        else:
+            self.slots[slot] = val
+
+    def __len__(self):
+        return len(self.slots)
+
+    def items(self):
+        return zip(self.shape.fields, self.slots)
+
+    def __repr__(self):     # prints the way objects did when they were dicts
+        return repr(dict(self.items()))
+
+    def __copy__(self):
+        obj = Object(self.shape)
+        obj.slots = list(self.slots)
+        return obj
+
+    def __deepcopy__(self, memo):
+        obj = Object(self.shape)
+        memo[id(self)] = obj
+        obj.slots = copy.deepcopy(self.slots, memo)
+        return obj
+
+
+class MemberCache:      # Inline cache for one member access site: the last shape seen there and the member's slot in it
+    __slots__ = ('shape', 'slot')
+
+    def __init__(self):
+        self.shape = None
+        self.slot = None
+
+    def get(self, obj, name):       # obj[name], or None if obj has no such member
+        shape = obj.shape
+        if shape is self.shape:
+            return obj.slots[self.slot]
+        slot = shape.index.get(name)
+        if slot is None:
+            return None
+        self.shape = shape
+        self.slot = slot
+        return obj.slots[slot]
@@ -0,0 +1,28 @@
+# My Code
+
+# What Interpreter.run does to a program before the engines start: parse it, fold it (fold.py) and hoist
+# its loop invariants (licm.py). The result only depends on the source and these options, which is what
+# lets cache.py keep it on disk and batch.py work it out in other processes. The parser may recover from
+# a syntax error and still give a tree, so what it reported is kept with the tree, to be printed again
+# by whoever runs it later.
+
+from brewlex import reported
+from brewparse import parse_program
+from fold import Folder
+from licm import Hoister
+
+
+def compile_program(program, fold=True, licm=True, backend=None):       # (tree, what was folded, expressions hoisted, messages)
+    with reported() as messages:
+        ast = parse_program(program, backend=backend)
+    fold_stats = {}
+    hoisted = 0
+    if fold:
+        folder = Folder()
+        folder.fold(ast)
+        fold_stats = folder.stats
+    if licm:
+        hoister = Hoister()
+        hoister.hoist(ast)
+        hoisted = hoister.hoisted
+    return ast, fold_stats, hoisted, messages
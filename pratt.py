@@ -0,0 +1,297 @@
+# My Code
+
+# Hand-written parser for Brewin: recursive descent for programs and statements, and precedence climbing
+# (Pratt) for expressions, with the binding powers taken from brewparse.py's precedence table. For every
+# program the PLY grammar in brewparse.py accepts it builds the same tree, node for node, without PLY's
+# table lookups and a Python call per reduction.
+#
+# It stops with a ParseError at the first token that cannot continue a valid program, which carries the
+# line, column and what was expected there. brewparse.Parser then hands the tokens read so far, and the
+# rest, to the PLY parser, so syntax errors are reported (and recovered from) exactly as they always were.
+#
+# A large program is hundreds of thousands of tokens and nodes, so the paths every token or node takes
+# are kept short: nodes are built by element.maker constructors, the current token is advanced inline
+# where it is known to be the one expected, and a name and its call are read without a call per part.
+
+from element import Element, QualifiedName, maker
+from intbase import InterpreterBase
+
+UNARY = ('UMINUS', 'NOT')       # the precedence table's levels for prefix operators
+CONVERSIONS = {'INT': 'int', 'STR': 'str', 'BOOL': 'bool'}
+END = '$end'        # token type at the end of the program, as PLY calls it
+
+new_binary = {}         # operator -> constructor of its node, filled in as operators are seen
+new_assign = maker('=', 'var', 'expression')
+new_qname = maker(InterpreterBase.QUALIFIED_NAME_NODE, 'name')
+new_call = maker(InterpreterBase.FCALL_NODE, 'name', 'args')
+new_int = maker(InterpreterBase.INT_NODE, 'val')
+new_string = maker(InterpreterBase.STRING_NODE, 'val')
+new_bool = maker(InterpreterBase.BOOL_NODE, 'val')
+new_if = maker(InterpreterBase.IF_NODE, 'condition', 'statements', 'else_statements')
+new_while = maker(InterpreterBase.WHILE_NODE, 'condition', 'statements')
+new_return = maker(InterpreterBase.RETURN_NODE, 'expression')
+new_function = maker(InterpreterBase.FUNC_NODE, 'name', 'args', 'statements')
+new_arg = maker(InterpreterBase.ARG_NODE, 'name', 'ref')
+
+
+def binding_powers(precedence):     # (binary operator token -> (left, right) binding power, prefix operators' power)
+    binary = {}
+    unary = 0
+    for level, (assoc, *token_types) in enumerate(precedence, 1):
+        for token_type in token_types:
+            if token_type in UNARY:
+                unary = level
+            else:
+                binary[token_type] = (level, level if assoc == 'left' else level - 1)
+    return binary, unary
+
+
+class ParseError(SyntaxError):
+    pass
+
+
+class PrattParser:
+
+    def __init__(self, lexer, binding):
+        self.lexer = lexer
+        self.binary, unary = binding
+        self.operand = unary - 1        # what a prefix operator's operand is parsed with: no binary operator binds that tightly
+        self.seen = []          # tokens read since parse() started
+
+    def parse(self, program):       # the tree, or a ParseError
+        self.source = program
+        self.seen = []
+        self.keep = self.seen.append
+        self.lexer.input(program)
+        self.next_token = self.lexer.token
+        self.token = None
+        self.type = None
+        self.advance()
+        return self.program()
+
+    def advance(self):      # moves on to the next token, gives the one it was on
+        token = self.token
+        following = self.next_token()
+        if following is None:
+            self.token = None
+            self.type = END
+        else:
+            self.keep(following)
+            self.token = following
+            self.type = following.type
+        return token
+
+    def expect(self, token_type):       # the value of the current token, which must be of token_type
+        if self.type != token_type:
+            self.fail(token_type)
+        token = self.token
+        following = self.next_token()       # advance(), inline
+        if following is None:
+            self.token = None
+            self.type = END
+        else:
+            self.keep(following)
+            self.token = following
+            self.type = following.type
+        return token.value
+
+    def fail(self, expected):
+        source = self.source
+        token = self.token
+        pos = len(source) if token is None else token.lexpos
+        start = source.rfind('\n', 0, pos) + 1
+        stop = source.find('\n', pos)
+        line = source[start:] if stop == -1 else source[start:stop]
+        if token is None:
+            lineno, found = source.count('\n') + 1, "the end of the program"
+        else:
+            lineno, found = token.lineno, repr(token.value)
+        raise ParseError(f"Syntax error: expected {expected}, found {found}", ("<program>", lineno, pos - start + 1, line))
+
+
+    ### ####################### ###
+    ### PROGRAMS AND STATEMENTS ###
+    ### ####################### ###
+
+    def program(self):
+        interfaces = []
+        while self.type == 'INTERFACE':
+            interfaces.append(self.interface())
+        functions = [self.function()]
+        while self.type != END:
+            functions.append(self.function())
+        if interfaces:
+            return Element(InterpreterBase.PROGRAM_NODE, interfaces=interfaces, functions=functions)
+        return Element(InterpreterBase.PROGRAM_NODE, functions=functions)
+
+    def interface(self):
+        self.advance()
+        name = self.expect('NAME')
+        self.expect('LBRACE')
+        fields = [self.field()]
+        while self.type != 'RBRACE':
+            fields.append(self.field())
+        self.advance()
+        return Element(InterpreterBase.INTERFACE_NODE, name=name, fields=fields)
+
+    def field(self):
+        name = self.expect('NAME')
+        if self.type == 'LPAREN':
+            self.advance()
+            params = self.formal_args()
+            self.expect('SEMI')
+            return Element(InterpreterBase.FIELD_FUNC_NODE, name=name, params=params)
+        self.expect('SEMI')
+        return Element(InterpreterBase.FIELD_VAR_NODE, name=name)
+
+    def function(self):
+        self.expect('DEF')
+        name = self.expect('NAME')
+        self.expect('LPAREN')
+        args = self.formal_args()
+        return new_function(name, args, self.statements())
+
+    def formal_args(self):      # after the '(', up to and including the ')'
+        args = []
+        if self.type != 'RPAREN':
+            args.append(self.formal_arg())
+            while self.type == 'COMMA':
+                self.advance()
+                args.append(self.formal_arg())
+        self.expect('RPAREN')
+        return args
+
+    def formal_arg(self):
+        if self.type == 'AMP':
+            self.advance()
+            return new_arg(self.expect('NAME'), True)
+        return new_arg(self.expect('NAME'), False)
+
+    def statements(self):       # a block, at least one statement between braces
+        self.expect('LBRACE')
+        statement = self.statement
+        statements = [statement()]
+        while self.type != 'RBRACE':
+            statements.append(statement())
+        self.advance()
+        return statements
+
+    def statement(self):
+        match self.type:
+            case 'NAME':        # an assignment, or an expression statement that starts with a name
+                name = self.qualified_name()
+                if self.type == 'ASSIGN':
+                    self.advance()
+                    statement = new_assign(name, self.expression(0))
+                else:
+                    statement = self.operators(self.name_or_call(name), 0)
+            case 'VAR' | 'BVAR':
+                kind = InterpreterBase.VAR_DEF_NODE if self.advance().type == 'VAR' else InterpreterBase.BVAR_DEF_NODE
+                statement = Element(kind, name=QualifiedName(self.expect('NAME')))
+            case 'IF':
+                self.advance()
+                condition = self.condition()
+                statements = self.statements()
+                else_statements = None
+                if self.type == 'ELSE':
+                    self.advance()
+                    else_statements = self.statements()
+                return new_if(condition, statements, else_statements)
+            case 'WHILE':
+                self.advance()
+                condition = self.condition()
+                return new_while(condition, self.statements())
+            case 'RETURN':
+                self.advance()
+                expression = None if self.type == 'SEMI' else self.expression(0)
+                statement = new_return(expression)
+            case _:
+                statement = self.expression(0)
+        self.expect('SEMI')
+        return statement
+
+    def condition(self):        # ( expression )
+        self.expect('LPAREN')
+        condition = self.expression(0)
+        self.expect('RPAREN')
+        return condition
+
+
+    ### ########### ###
+    ### EXPRESSIONS ###
+    ### ########### ###
+
+    def expression(self, power):        # an expression, as far as operators that bind tighter than power take it
+        if self.type == 'NAME':     # the most common operand, see prefix()
+            left = self.name_or_call(self.qualified_name())
+        else:
+            left = self.prefix()
+        return self.operators(left, power)
+
+    def operators(self, left, power):
+        powers = self.binary.get(self.type)
+        while powers is not None and powers[0] > power:
+            op = self.advance().value
+            make = new_binary.get(op)
+            if make is None:
+                make = new_binary[op] = maker(op, 'op1', 'op2')
+            left = make(left, self.expression(powers[1]))
+            powers = self.binary.get(self.type)
+        return left
+
+    def prefix(self):       # an operand, with any prefix operators in front of it
+        match self.type:
+            case 'NAME':
+                return self.name_or_call(self.qualified_name())
+            case 'NUMBER':
+                return new_int(self.advance().value)
+            case 'STRING':
+                return new_string(self.advance().value)
+            case 'LPAREN':
+                return self.condition()
+            case 'MINUS':
+                self.advance()
+                return Element(InterpreterBase.NEG_NODE, op1=self.expression(self.operand))
+            case 'NOT':
+                self.advance()
+                return Element(InterpreterBase.NOT_NODE, op1=self.expression(self.operand))
+            case 'TRUE' | 'FALSE':
+                return new_bool(self.advance().value == InterpreterBase.TRUE_DEF)
+            case 'NIL':
+                self.advance()
+                return Element(InterpreterBase.NIL_NODE)
+            case 'AT':
+                self.advance()
+                return Element(InterpreterBase.EMPTY_OBJ_NODE)
+            case 'INT' | 'STR' | 'BOOL':
+                to_type = CONVERSIONS[self.advance().type]
+                return Element(InterpreterBase.CONVERT_NODE, to_type=to_type, expr=self.condition())
+            case 'LAMBDA':
+                name = self.advance().value
+                self.expect('LPAREN')
+                args = self.formal_args()
+                return new_function(name, args, self.statements())
+            case 'CLOSURE':
+                self.advance()
+                return Element(InterpreterBase.CLOSURE_NODE, args=self.expect('NAME'))
+        self.fail("an expression")
+
+    def qualified_name(self):
+        name = self.expect('NAME')
+        while self.type == 'DOT':
+            self.advance()
+            name = name + "." + self.expect('NAME')
+        return QualifiedName(name)
+
+    def name_or_call(self, name):
+        if self.type != 'LPAREN':
+            return new_qname(name)
+        self.advance()
+        args = []
+        if self.type != 'RPAREN':
+            args.append(self.expression(0))
+            while self.type == 'COMMA':
+                self.advance()
+                args.append(self.expression(0))
+        self.expect('RPAREN')
+        return new_call(name, args)
@@ -0,0 +1,222 @@
+# My Code
+
+# Lexical addressing for the compiled engines. Every environment a function can build at run time
+# (the function's own, and one per if/while block) gets a Scope that lists, ahead of time, every
+# name that could ever be defined in it and gives each one a slot. At run time those environments
+# are Frames holding a plain list indexed by slot, and a name compiles to the (level, slot) pairs
+# it may live at, innermost first. level is how deeply the environment is nested in the function,
+# and every Frame keeps the slot lists of its enclosing frames by level (Frame.display), so a lookup
+# is two list indexes instead of a dict probe per enclosing environment.
+#
+# A name is only bound once its var/bvar/arg has run, so an unbound slot holds None and the lookup
+# moves on to the next address, exactly like the tree walker moving on to the parent dict.
+
+import contextlib
+import copy
+from intbase import ErrorType
+from environment import Frame, Variable, Reference, qualify
+from element import Element
+from objects import Object
+
+
+PLAIN = (int, str, bool, Object)        # arguments bound as they are, without a copy
+
+
+class NestingError(RecursionError):     # a function nested too deeply to resolve or compile. Interpreter.execute turns a
+    pass                                # RecursionError into a STACK_ERROR, but only one from running calls, not this
+
+
+@contextlib.contextmanager
+def compiling(name):        # a RecursionError out of the block, resolving or compiling function name, is a NestingError
+    try:
+        yield
+    except NestingError:
+        raise
+    except RecursionError as e:
+        raise NestingError(f"{name} is nested too deeply to compile") from e
+
+
+class Scope:
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.level = parent.level + 1 if parent is not None else 0
+        self.layout = {}        # name -> slot
+        self.captures = ()      # lambdas only: (slot, addresses in the creating scope) to fill when created
+        self.kept = False       # lambdas: the frame is made when the lambda is, so its layout must not grow after that
+
+    def add(self, name):
+        name = str(name)        # see element.QualifiedName
+        if name not in self.layout:
+            self.layout[name] = len(self.layout)
+
+    def address(self, name):        # every (level, slot) name can be bound at from here, innermost first
+        found = []
+        scope = self
+        while scope is not None:
+            if name in scope.layout:
+                found.append((scope.level, scope.layout[name]))
+            scope = scope.parent
+        return tuple(found)
+
+    def visible(self):      # every name that can be bound somewhere up the chain
+        names = {}
+        scope = self
+        while scope is not None:
+            names.update(scope.layout)
+            scope = scope.parent
+        return names
+
+    def frame(self, parent=None):
+        return Frame(self.layout, parent)
+
+    def bind(self, fcn, args, caller, frame=None):      # Function.bind for fcn's own scope, straight into the slots of a
+        if frame is None:                               # new frame, or of frame emptied for reuse. A lambda keeps its own
+            frame = Frame(self.layout)                  # environment and binds as usual.
+        else:
+            frame.values[:] = [None] * len(self.layout)
+        values = frame.values
+        layout = self.layout
+
+        if fcn.selfo is not None:
+            values[layout['selfo']] = fcn.selfo
+
+        if len(args) != len(fcn.params):
+            return ErrorType.NAME_ERROR
+
+        for param, arg in zip(fcn.params, args):
+            name = param.get('name')
+            bound = bind_arg(frame, name, param.get('ref'), arg, caller)
+            if type(bound) is ErrorType:
+                return bound
+            values[layout[name]] = bound
+
+        return frame
+
+    def capture(self, env):     # A lambda's persistent environment, filled the way LambdaFcn.populate fills it
+        frame = Frame(self.layout)
+        for slot, addresses in self.captures:
+            val = lookup(env, addresses)
+            if val is not None:
+                frame.values[slot] = copy.copy(val)
+        return frame
+
+
+def bind_arg(env, name, ref, arg, caller):      # what parameter name is bound to for arg, or an ErrorType, as in Function.bind
+    val = arg.get_val() if isinstance(arg, Variable) else arg
+    if not env.compare_types(name, val, caller):
+        return ErrorType.TYPE_ERROR
+
+    if ref:
+        return Reference(arg if isinstance(arg, Variable) else Variable(arg))
+    if type(val) in PLAIN:
+        return Variable(val)
+    val = copy.copy(val)        # copy.copy makes a new object, which is checked again (a copy of nil is not nil)
+    if not env.compare_types(name, val, caller):
+        return ErrorType.TYPE_ERROR
+    return Variable(val)
+
+
+def lookup(env, addresses):     # What the name at addresses is bound to in env, or None if it is unbound
+    display = env.display
+    for level, slot in addresses:
+        val = display[level][slot]
+        if val is not None:
+            return val
+    return None
+
+
+def declare(scope, statements, top=False):      # top: the environment has no parent, so var lands in it
+    for statement in statements or []:
+        match statement.elem_type:
+            case 'bvardef':
+                scope.add(statement.get('name'))
+            case 'vardef':
+                if top:
+                    scope.add(statement.get('name'))
+            case 'if' | 'while':        # var in a block defines the name in the block's parent
+                for block in (statement.get('statements'), statement.get('else_statements')):
+                    for child in block or []:
+                        if child.elem_type == 'vardef':
+                            scope.add(child.get('name'))
+
+
+def needs_scope(*blocks):       # False if nothing can ever be defined in an environment running these blocks,
+    for statements in blocks:       # which then only passes lookups on to its parent and can be left out
+        for statement in statements or []:
+            match statement.elem_type:
+                case 'bvardef' | 'vardef':      # var lands in the parent, so leaving the block out would move it
+                    return True
+                case 'if' | 'while':
+                    for block in (statement.get('statements'), statement.get('else_statements')):
+                        for child in block or []:
+                            if child.elem_type == 'vardef':
+                                return True
+    return False
+
+
+def captured_names(node):       # names a lambda's body can ever look at in the environment it is created in: the first
+    names = node.captured           # segment of every name used anywhere in it, nested lambdas included. Names it declares
+    if names is None:               # count too, as declaring an already captured name is an error
+        found = set()
+        collect_names(node.get('statements'), found)
+        names = node.captured = frozenset(found)
+    return names
+
+
+def collect_names(value, found):
+    if isinstance(value, list):
+        for item in value:
+            collect_names(item, found)
+    elif isinstance(value, Element):
+        name = value.get('name')
+        if name is not None:
+            found.add(qualify(name).segments[0])
+        for item in value.values():
+            collect_names(item, found)
+
+
+def function_scope(params, statements, closure=None, captured=()):     # closure: where a lambda is created,
+    scope = Scope()                                                     # captured: what it uses from there
+    scope.add('selfo')
+    for param in params:
+        scope.add(param.get('name'))
+    declare(scope, statements, top=True)
+
+    if closure is not None:
+        scope.kept = True
+        names = [name for name in closure.visible() if name in captured]
+        for name in names:
+            scope.add(name)
+        scope.captures = tuple((scope.layout[name], closure.address(name)) for name in names)
+    return scope
+
+
+def block_scope(parent, *blocks):
+    scope = Scope(parent)
+    for statements in blocks:
+        declare(scope, statements)
+    return scope
+
+
+class Resolver:
+
+    def __init__(self):
+        self.scopes = {}        # id(statements) -> (statements, Scope), see Compiler.bodies
+
+    def function(self, fcn):        # Scope of a named function, or of a lambda already seen by closure()
+        entry = self.scopes.get(id(fcn.statements))
+        if entry is None:
+            with compiling(fcn.name):
+                entry = (fcn.statements, function_scope(fcn.params, fcn.statements))
+            self.scopes[id(fcn.statements)] = entry
+        return entry[1]
+
+    def closure(self, node, enclosing):     # Scope of the lambda node, created inside enclosing
+        statements = node.get('statements')
+        entry = self.scopes.get(id(statements))
+        if entry is None:
+            with compiling(node.get('name')):
+                entry = (statements, function_scope(node.get('args'), statements, enclosing, captured_names(node)))
+            self.scopes[id(statements)] = entry
+        return entry[1]
@@ -0,0 +1,133 @@
+# My Code
+
+# Hand-written lexer for Brewin, a drop-in for the PLY lexer in brewlex.py: it gives the parser the same
+# tokens, with the same values and line numbers, and reports illegal characters the same way. PLY tries
+# one regex with an alternative per rule at every position and calls a Python function for every name,
+# number and string it finds. Scanner looks at the first character of the token instead, which decides
+# what the token can be, and only runs a regex for the rest of a name or number.
+#
+# The rules it follows, which are the order PLY tries brewlex.py's in:
+#   a number, "lambda" plus a type character as a whole word, a name (reserved words become their
+#   token), newlines (counted), a comment (its newlines counted), a string on one line, then the
+#   operators, longest first. An unclosed string starts with the literal '"', an unclosed comment
+#   with DIVIDE, and anything else is an illegal character, reported and skipped.
+
+import collections
+import functools
+import re
+import sys
+
+from brewlex import report, reserved_map
+
+Token = collections.namedtuple('Token', 'type value lineno lexpos lexer')     # what the parser reads of a PLY LexToken
+new_token = tuple.__new__
+
+SINGLE = {      # operators of one character -> their token type
+    '(': 'LPAREN', ')': 'RPAREN', '{': 'LBRACE', '}': 'RBRACE', ',': 'COMMA', ';': 'SEMI', '+': 'PLUS', '-': 'MINUS',
+    '*': 'MULTIPLY', '/': 'DIVIDE', '.': 'DOT', '@': 'AT', '=': 'ASSIGN', '>': 'GREATER', '<': 'LESS', '!': 'NOT', '&': 'AMP',
+}
+DOUBLE = {'==': 'EQ', '>=': 'GREATER_EQ', '<=': 'LESS_EQ', '!=': 'NOT_EQ', '&&': 'AND', '||': 'OR'}     # tried first
+LAMBDA_TYPES = frozenset('bifosvABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+# character classes
+SPACE, NEWLINE, DIGIT, LETTER, QUOTE, SLASH, OPERATOR, PAIR = range(8)      # PAIR: may start a DOUBLE
+CLASSES = {' ': SPACE, '\t': SPACE, '\n': NEWLINE, '"': QUOTE, '/': SLASH, '_': LETTER}
+CLASSES.update((c, DIGIT) for c in '0123456789')
+CLASSES.update((c, LETTER) for c in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+CLASSES.update((c, OPERATOR) for c in SINGLE if c != '/')
+CLASSES.update((op[0], PAIR) for op in DOUBLE)
+
+NUMBER = re.compile(r"\d+")         # the same patterns as brewlex.py's rules, Unicode digits included
+NAME = re.compile(r"[A-Za-z_][\w_]*")
+NEWLINES = re.compile(r"\n+")
+SPACES = re.compile(r"[ \t]+")
+
+
+class Scanner:
+
+    def __init__(self):
+        self.lineno = 1
+        self.input("")
+
+    def input(self, data):      # after this, token() gives data's tokens one by one, then None
+        self.token = functools.partial(next, self.scan(data), None)
+
+    def clone(self):
+        return Scanner()
+
+    def scan(self, data):
+        pos = 0
+        end = len(data)
+        lineno = self.lineno
+        get_class = CLASSES.get
+        match_name = NAME.match
+        intern = sys.intern
+        reserved = reserved_map.get
+
+        while pos < end:
+            c = data[pos]
+            kind = get_class(c)
+
+            if kind == LETTER:
+                text = match_name(data, pos).group()
+                if len(text) == 7 and text[6] in LAMBDA_TYPES and text.startswith('lambda'):
+                    yield new_token(Token, ('LAMBDA', text, lineno, pos, self))
+                else:
+                    text = intern(text)     # the tree then shares one string per name
+                    yield new_token(Token, (reserved(text, 'NAME'), text, lineno, pos, self))
+                pos += len(text)
+
+            elif kind == SPACE:
+                pos = SPACES.match(data, pos).end()
+
+            elif kind == OPERATOR:
+                yield new_token(Token, (SINGLE[c], c, lineno, pos, self))
+                pos += 1
+
+            elif kind == PAIR:
+                op = data[pos:pos + 2]
+                if op in DOUBLE:
+                    yield new_token(Token, (DOUBLE[op], op, lineno, pos, self))
+                    pos += 2
+                elif c in SINGLE:
+                    yield new_token(Token, (SINGLE[c], c, lineno, pos, self))
+                    pos += 1
+                else:
+                    pos = self.illegal(data, pos)       # a '|' on its own
+
+            elif kind == NEWLINE:
+                newlines = NEWLINES.match(data, pos).end()
+                lineno += newlines - pos
+                self.lineno = lineno
+                pos = newlines
+
+            elif kind == DIGIT or (kind is None and c.isdecimal()):
+                text = NUMBER.match(data, pos).group()
+                yield new_token(Token, ('NUMBER', int(text), lineno, pos, self))
+                pos += len(text)
+
+            elif kind == QUOTE:
+                close = data.find('"', pos + 1)
+                if close == -1 or data.find('\n', pos + 1, close) != -1:
+                    yield new_token(Token, ('"', '"', lineno, pos, self))       # brewlex.py's literal
+                    pos += 1
+                else:
+                    yield new_token(Token, ('STRING', data[pos + 1:close], lineno, pos, self))
+                    pos = close + 1
+
+            elif kind == SLASH:
+                close = data.find('*/', pos + 2) if data.startswith('*', pos + 1) else -1
+                if close == -1:
+                    yield new_token(Token, ('DIVIDE', '/', lineno, pos, self))
+                    pos += 1
+                else:
+                    lineno += data.count('\n', pos, close)
+                    self.lineno = lineno
+                    pos = close + 2
+
+            else:
+                pos = self.illegal(data, pos)
+
+    def illegal(self, data, pos):       # brewlex.t_error: report it, carry on after it
+        report(f"Illegal character {data[pos]}")
+        return pos + 1
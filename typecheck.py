@@ -0,0 +1,345 @@
+# My Code
+
+# Static type pass. A Brewin name carries its type in its last character, and every assignment,
+# parameter and field is checked against that character at run time, so the type of most
+# expressions is known before the program runs. TypeChecker.check() records it on each expression
+# node as static_type, which lets the compiled engines drop run time checks that can never fail,
+# and collects the operations that would fail whenever they ran (raising the first one in strict mode).
+#
+# Strict mode is a conservative static check: it can reject a program that would run, and it can name
+# a different error than the one the engines would raise first. Only code that certainly cannot run is
+# skipped (still typed, never reported): statements after a return that ends the function or loop, or
+# after an endless while(true), branches of an if or while on a literal condition, and functions no
+# name in the program refers to. Everything else is checked as if it ran, which includes
+#   - branches whose condition is never true, lambdas, and functions named but never called,
+#   - names that are never bound: they are typed from their suffix, so `undefinedi + "a"` is a
+#     TYPE_ERROR here where the engines raise NAME_ERROR (so is selfo in a function not called as a
+#     method),
+#   - operands that fail first: `ai / 0 + "x"` is a TYPE_ERROR here, the engines divide by zero first.
+#
+# static_type is one of:
+#   'i', 's', 'b'     int, str, bool
+#   'o' / uppercase   an object or nil
+#   'f'               a function or nil
+#   'nil'             nil
+#   None              not known statically (function results, conversions of unknown values, ...)
+
+from intbase import ErrorType
+from element import Element
+import operator
+
+PRIMITIVES = ('i', 's', 'b')
+ARITHMETIC = ('-', '*', '/', '<', '<=', '>', '>=')
+LOGICAL = ('&&', '||')
+
+# (operator, operand type) -> plain Python operation, for operators whose checks always pass when
+# both operands have that static type
+UNCHECKED_OPS = {
+    ('+', 'i'): operator.add, ('+', 's'): operator.add,
+    ('-', 'i'): operator.sub, ('*', 'i'): operator.mul, ('/', 'i'): operator.floordiv,
+    ('<', 'i'): operator.lt, ('<=', 'i'): operator.le, ('>', 'i'): operator.gt, ('>=', 'i'): operator.ge,
+    ('&&', 'b'): operator.and_, ('||', 'b'): operator.or_,
+    ('neg', 'i'): operator.neg, ('!', 'b'): operator.not_,
+}
+for _t in PRIMITIVES:
+    UNCHECKED_OPS[('==', _t)] = operator.eq
+    UNCHECKED_OPS[('!=', _t)] = operator.ne
+
+
+def name_type(name):
+    t = name[-1]
+    if t in ('i', 's', 'b', 'o', 'f') or t.isupper():
+        return t
+    return None
+
+
+def is_object(t):       # values of these types are always an object or nil
+    return t == 'o' or t == 'nil' or (t is not None and t.isupper())
+
+
+def signature(args):        # type chars of a call's arguments, the way its function is looked up, or None if not all known
+    chars = []
+    for arg in args:
+        t = arg.static_type
+        if t in PRIMITIVES:
+            chars.append(t)
+        elif is_object(t):
+            chars.append('o')
+        else:
+            return None
+    return tuple(chars)
+
+
+def referenced(value, found):       # last segments of every name used in value: a function named nowhere is never called
+    if isinstance(value, list):
+        for item in value:
+            referenced(item, found)
+    elif isinstance(value, Element):
+        name = value.get('name')
+        if name is not None:
+            found.add(name.split('.')[-1])
+        for item in value.values():
+            referenced(item, found)
+    return found
+
+
+def literal_condition(condition):       # True or False for a literal bool condition (after fold.py), else None
+    if condition.elem_type == 'bool':
+        return condition.get('val')
+    return None
+
+
+def always_accepts(name, t):        # True if storing (or returning) a value of static type t under name can never fail its check
+    n = name[-1]
+    if n in PRIMITIVES:
+        return t == n
+    if n == 'o':
+        return t == 'o' or t == 'nil'
+    if n.isupper():
+        return t == 'nil'
+    return False
+
+
+class TypeChecker:
+
+    def __init__(self, interpreter, strict=False):
+        self.interpreter = interpreter
+        self.strict = strict
+        self.errors = []        # (ErrorType, description) for every operation that is certain to fail
+        self.dead = 0           # > 0 while checking code that cannot run: typed as usual, but nothing in it fails
+
+    def check(self, ast):
+        functions = ast.get('functions')
+        names = referenced([function.get('statements') for function in functions], set())
+        for function in functions:
+            name = function.get('name')
+            if name == 'main' or name in names:
+                self.function(function)
+            else:
+                self.unreachable(self.function, function)
+        return self.errors
+
+    def unreachable(self, check, *args):
+        self.dead += 1
+        try:
+            return check(*args)
+        finally:
+            self.dead -= 1
+
+    def fail(self, error_type, description):
+        if self.dead:
+            return
+        self.errors.append((error_type, description))
+        if self.strict:
+            self.interpreter.error(error_type, f"{description} (found before running)")
+
+
+    ### ########## ###
+    ### STATEMENTS ###
+    ### ########## ###
+
+    def function(self, function):
+        name = function.get('name')
+        statements = function.get('statements')
+        for n, statement in enumerate(statements):
+            if statement.elem_type == 'return':
+                val = statement.get('expression')
+                if name[-1] != 'f':
+                    self.statement(statement, name)
+                elif val is not None and val.elem_type == 'func':
+                    self.expression(val)        # other f-typed returns look the function up by name
+                break       # nothing after a top level return runs
+            if self.statement(statement, name):
+                self.unreachable(self.block, statements[n + 1:], name)
+                break
+
+    def block(self, statements, fname, loop=False):      # True if running the statements never gets past them
+        for n, statement in enumerate(statements or []):
+            if self.statement(statement, fname) or (loop and statement.elem_type == 'return'):
+                self.unreachable(self.block, statements[n + 1:], fname)
+                return True
+        return False
+
+    def branch(self, statements, fname, runs, loop=False):       # runs: False if the branch is certain never to be taken
+        if runs is False:
+            self.unreachable(self.block, statements, fname, loop)
+            return False
+        return self.block(statements, fname, loop)
+
+    def statement(self, statement, fname):      # True if running it never gets to the next statement
+        match statement.elem_type:
+            case '=':
+                var = statement.get('var')
+                expression = statement.get('expression')
+                if var[-1] == 'f':
+                    if expression.elem_type == 'func':
+                        self.expression(expression)     # anything else is looked up by name, not evaluated
+                    return
+                t = self.expression(expression)
+                if not self.assignable(var, t):
+                    self.fail(ErrorType.TYPE_ERROR, f"Cannot assign a value of type {t} to {var}")
+
+            case 'fcall':
+                self.expression(statement)
+
+            case 'if':
+                t = self.expression(statement.get('condition'))
+                if t == 's' or t == 'f' or is_object(t):
+                    self.fail(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean")
+                taken = literal_condition(statement.get('condition'))
+                then = self.branch(statement.get('statements'), fname, taken is not False)
+                other = self.branch(statement.get('else_statements'), fname, taken is not True)
+                return (then or taken is False) and (other or taken is True)
+
+            case 'while':
+                t = self.expression(statement.get('condition'))
+                if t == 'f' or is_object(t):        # the first check also lets "true"/"false" through
+                    self.fail(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean")
+                taken = literal_condition(statement.get('condition'))
+                body = statement.get('statements') or []
+                self.branch(body, fname, taken is not False, loop=True)
+                return taken is True and not any(s.elem_type == 'return' and s.get('expression') is None for s in body)     # see 'return'
+
+            case 'return':      # nested: only a value ends the function. A bare return ends the while loop whose
+                                # body it is in, and does nothing inside an if (interpreterv4.call_if, call_while)
+                if statement.get('expression') is None:
+                    return False
+                t = self.expression(statement.get('expression'))
+                if not self.returnable(fname, t):
+                    self.fail(ErrorType.TYPE_ERROR, f"Cannot return a value of type {t} from {fname}")
+                return True
+
+            case _:
+                pass        # definitions, and expression statements (which never run)
+        return False
+
+    def assignable(self, var, t):       # False only if compare_types is certain to reject a value of type t
+        if t is None:
+            return True
+        v = var[-1]
+        if v in PRIMITIVES:
+            return t == v
+        if v == 'o' or v.isupper():
+            return is_object(t)
+        return False
+
+    def returnable(self, fname, t):     # False only if Function.ret is certain to reject a value of type t
+        if t is None:
+            return True
+        r = fname[-1]
+        if fname == 'main' or r == 'v':
+            return False
+        if r in PRIMITIVES:
+            return t == r
+        if r == 'f':        # a nested return from an f function hands its value back unchecked (see Function.call)
+            return True
+        return is_object(t)
+
+
+    ### ########### ###
+    ### EXPRESSIONS ###
+    ### ########### ###
+
+    def expression(self, expression):
+        t = self.infer(expression)
+        expression.static_type = t
+        return t
+
+    def infer(self, expression):
+        expression_type = expression.elem_type
+
+        match expression_type:
+            case 'int':
+                return 'i'
+            case 'string':
+                return 's'
+            case 'bool':
+                return 'b'
+            case 'nil':
+                return 'nil'
+            case '@':
+                return 'o'
+            case 'qname':
+                return name_type(expression.get('name'))
+            case 'func':
+                self.function(expression)
+                return 'f' if expression.get('name')[:-1] == 'lambda' else None
+            case 'fcall':
+                return self.call(expression)
+            case 'invariant':
+                return self.expression(expression.get('expr'))
+            case 'convert':
+                t = self.expression(expression.get('expr'))
+                if is_object(t):
+                    self.fail(ErrorType.TYPE_ERROR, "Incompatible type for conversion (object)")
+                if t not in PRIMITIVES:
+                    return None     # a function converts to nothing
+                return {'int': 'i', 'str': 's', 'bool': 'b'}[expression.get('to_type')]
+            case 'neg':
+                t = self.expression(expression.get('op1'))
+                return self.expect(t, 'i', "arithmetic")
+            case '!':
+                t = self.expression(expression.get('op1'))
+                return self.expect(t, 'b', "boolean")
+
+        if expression.get('op1') is None or expression.get('op2') is None:
+            return None
+
+        t1 = self.expression(expression.get('op1'))
+        t2 = self.expression(expression.get('op2'))
+
+        if expression_type == '+':
+            if t1 == t2 and t1 in ('i', 's'):
+                return t1
+            if t1 is not None and t2 is not None:
+                self.fail(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation")
+            return None
+
+        if expression_type in ARITHMETIC:
+            if self.expect_both(t1, t2, 'i', "arithmetic") is None:
+                return None
+            return 'i' if expression_type in ('-', '*', '/') else 'b'
+
+        if expression_type in LOGICAL:
+            if self.interpreter.short_circuit:      # op2 may never run, so only op1 is certain to be checked
+                if self.expect(t1, 'b', "boolean") is None:
+                    return None
+                return 'b' if t2 == 'b' else None
+            return self.expect_both(t1, t2, 'b', "boolean")
+
+        if expression_type in ('==', '!='):
+            return 'b'
+
+        return None
+
+    def expect(self, t, wanted, kind):
+        if t is not None and t != wanted:
+            self.fail(ErrorType.TYPE_ERROR, f"Incompatible types for {kind} operation")
+            return None
+        return t
+
+    def expect_both(self, t1, t2, wanted, kind):
+        if (t1 is not None and t1 != wanted) or (t2 is not None and t2 != wanted):
+            self.fail(ErrorType.TYPE_ERROR, f"Incompatible types for {kind} operation")
+            return None
+        return wanted if t1 == wanted and t2 == wanted else None
+
+    def call(self, expression):
+        name = expression.get('name')
+        types = [self.expression(arg) for arg in expression.get('args')]
+
+        match name:
+            case 'print':
+                return None
+            case 'inputi':
+                return 'i'
+            case 'inputs':
+                return 's'
+
+        if name[-1] == 'f' or any(t is None or t == 'f' for t in types):
+            return None
+
+        signature = tuple('o' if is_object(t) else t for t in types)
+        if self.interpreter.overload(name, signature) is None:
+            self.fail(ErrorType.NAME_ERROR, f"Function {name} has not been defined for arguments {''.join(signature)}")
+        return None
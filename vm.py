@@ -0,0 +1,920 @@
+# My Code
+
+# Bytecode backend. Each function body is lowered once into a Code object: a flat instruction
+# stream (opcode, argument, opcode, argument, ...) and a constant pool that arguments index into.
+# The VM runs that stream in one dispatch loop and keeps Brewin frames on its own stack, so a
+# Brewin call never recurses in Python. Semantics follow the tree walker in interpreterv4.py.
+
+from intbase import ErrorType
+from nil_module import Nil
+from environment import Variable, Frame, qualify, straight_path, descend
+from function import LambdaFcn
+from compiler import equals, default, to_str, unwrap
+from typecheck import UNCHECKED_OPS, always_accepts, signature
+from resolver import Resolver, block_scope, lookup, needs_scope, compiling
+from objects import Object, MemberCache
+
+
+### ####### ###
+### OPCODES ###
+### ####### ###
+
+OPCODES = (
+    'LOAD_CONST',           # push consts[arg]
+    'LOAD_VAR',             # push the Variable for plain name consts[arg] = (name, addresses)
+    'LOAD_VAR_VALUE',       # push the value of plain name consts[arg] = (name, addresses)
+    'LOAD_PATH',            # push the Variable for dotted name consts[arg] = (name, addresses, steps, last, cache)
+    'LOAD_PATH_VALUE',      # push the value of dotted name consts[arg], same layout
+    'STORE_VAR',            # pop a value into plain name consts[arg] = (name, addresses)
+    'STORE_VAR_UNCHECKED',  # same, when the value's static type always passes the check
+    'STORE_PATH',           # pop a value into dotted name consts[arg], same layout as LOAD_PATH
+    'FUNC_REF',             # push the function whose key starts with consts[arg] (f-typed assignment)
+    'DEFINE',               # run the var/bvar node consts[arg]
+    'NEW_OBJECT',
+    'MAKE_LAMBDA',          # consts[arg] = (func node, its Scope), push a closure over the current environment
+    'CONVERT',              # int()/str()/bool() to type consts[arg]
+    'NEG',
+    'NOT',
+    'ADD',
+    'SUB',
+    'MUL',
+    'DIV',
+    'LT',
+    'LE',
+    'GT',
+    'GE',
+    'EQ',
+    'NE',
+    'AND',
+    'OR',
+    'SHORT_CIRCUIT',        # consts[arg] = (value that decides, pc): check the top of the stack is a bool, leave it
+                            # there and jump to pc if it is that value, else pop it (short_circuit && and ||)
+    'CHECK_BOOL',           # check the top of the stack is a bool (the right operand of a short-circuit && or ||)
+    'UNARY_UNCHECKED',      # apply consts[arg] to the top of the stack, operand types statically proven
+    'BINARY_UNCHECKED',     # apply consts[arg] to the top two values, operand types statically proven
+    'POP',
+    'JUMP',                 # pc = arg
+    'IF_FALSE',             # pop an if condition, check it, jump to arg when false
+    'IF_FALSE_UNCHECKED',   # same for a condition statically proven to be a bool
+    'WHILE_FALSE',          # pop a while condition, check it is a boolean, jump to arg unless it is true
+    'COUNT_LOOP',           # one more iteration of the while node consts[arg], see Interpreter.loop_counts
+    'PUSH_BLOCK',           # open a block environment with layout consts[arg]
+    'POP_BLOCK',
+    'RESET_BLOCK',          # unbind every name of the innermost block, consts[arg] is a None per slot
+    'INVARIANT',            # consts[arg] = (invariant node, pc), push its cached value and jump to pc if it has one
+    'STORE_INVARIANT',      # cache the top of the stack in the invariant node consts[arg], leaving it there
+    'RESET_INVARIANTS',     # forget the cached values of the invariant nodes in consts[arg] (a loop is starting)
+    'CALL_NAMED',           # consts[arg] = (name, argc, Function if the argument types are known statically, else None, tail)
+    'CALL_VAR',             # consts[arg] = (name, argc, addresses or path if dotted, tail), name holds a function value
+                            # tail: 'top' or 'nested' when a return returns the call's result, else None
+    'CALL_PRINT',           # consts[arg] = argc
+    'CALL_INPUT',           # consts[arg] = (convert, argc)
+    'NESTED_RETURN',        # return inside if/while: None continues at arg, anything else returns
+    'RETURN_VALUE',
+    'RETURN_UNCHECKED',     # return a value Function.ret would hand back as is
+    'RETURN_DEFAULT',
+    'RETURN_FUNCTION',      # top level return of an f-typed function, consts[arg] = (expression, lambda Scope or None)
+    'TREE_STATEMENT',       # hand the statement consts[arg] to the tree walker
+)
+
+for _number, _name in enumerate(OPCODES):
+    globals()[_name] = _number
+
+BINARY_OPS = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, '<': LT, '<=': LE, '>': GT, '>=': GE,
+              '==': EQ, '!=': NE, '&&': AND, '||': OR}
+
+
+class Code:
+
+    def __init__(self, name):
+        self.name = name
+        self.ops = []       # opcode, argument, opcode, argument, ...
+        self.consts = []
+        self.index = {}     # constant -> position in consts, so identical constants share an entry
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 2
+
+    def const(self, value):
+        if type(value) in (int, str, bool, tuple) or value is None:
+            key = (type(value), value)
+        else:
+            key = id(value)         # nodes and Nil are shared by identity
+        if key not in self.index:
+            self.index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.index[key]
+
+    def here(self):
+        return len(self.ops)
+
+    def patch(self, at, target):
+        self.ops[at + 1] = target
+
+    def dump(self):
+        lines = [f"code {self.name}"]
+        for pc in range(0, len(self.ops), 2):
+            op, arg = self.ops[pc], self.ops[pc + 1]
+            lines.append(f"  {pc:4} {OPCODES[op]:18} {arg}")
+        return "\n".join(lines)
+
+
+### ######## ###
+### LOWERING ###
+### ######## ###
+
+class Lowering:
+
+    def __init__(self, name, scope, resolver, interpreter):
+        self.code = Code(name)
+        self.scope = scope          # Scope of the environment the code being lowered runs in
+        self.resolver = resolver
+        self.interpreter = interpreter
+
+    def name(self, name):       # constant for a plain name: the name and where it can be bound
+        return self.code.const((name, self.scope.address(name)))
+
+    def path(self, name):       # constant for a dotted name, addresses are None unless it can be walked straight down
+        path = straight_path(name)
+        if path is None:
+            return self.code.const((name, None, None, None, None))
+        addresses = self.scope.address(qualify(name).segments[0])
+        middle, last = path
+        steps = tuple((segment, MemberCache()) for segment in middle)       # this site's inline caches
+        return self.code.const((name, addresses, steps, last, MemberCache()))
+
+    def enter(self, *blocks):       # open a block, returns the enclosing scope for leave(), or None if the block
+        if not needs_scope(*blocks):        # runs in the enclosing environment
+            return None
+        outer = self.scope
+        self.scope = block_scope(outer, *blocks)
+        self.code.emit(PUSH_BLOCK, self.code.const(self.scope.layout))
+        return outer
+
+    def leave(self, outer):
+        if outer is not None:
+            self.scope = outer
+            self.code.emit(POP_BLOCK)
+
+    def function(self, statements):     # Top level of a function, mirrors the loop in Function.call
+        code = self.code
+        for statement in statements:
+            if statement.elem_type == 'return':
+                self.top_return(statement)
+                return code
+            self.statement(statement)
+        code.emit(RETURN_DEFAULT)
+        return code
+
+    def top_return(self, statement):
+        code = self.code
+        val = statement.get('expression')
+
+        if val is None:
+            code.emit(RETURN_DEFAULT)
+        elif self.code.name[-1] == 'f':
+            n = val.get('name')
+            closure = self.resolver.closure(val, self.scope) if n is not None and n[:-1] == 'lambda' else None
+            code.emit(RETURN_FUNCTION, code.const((val, closure)))
+        elif always_accepts(self.code.name, val.static_type):
+            self.returned(val, 'top', value=True)
+            code.emit(RETURN_UNCHECKED)
+        else:
+            self.returned(val, 'top')
+            code.emit(RETURN_VALUE)
+
+    def returned(self, val, tail, value=False):     # a returned expression; if it is a call, the call may take over the returning frame
+        if val.elem_type == 'fcall':
+            self.call(val, tail)
+        elif value:
+            self.value(val)
+        else:
+            self.expression(val)
+
+    def block(self, statements, loop_exit=None):
+        for statement in statements or []:
+            self.statement(statement, loop_exit)
+
+    def statement(self, statement, loop_exit=None):     # loop_exit: where a return that yields nothing jumps to
+        code = self.code
+
+        match statement.elem_type:
+            case 'vardef' | 'bvardef':
+                code.emit(DEFINE, code.const(statement))
+
+            case '=':
+                self.assign(statement)
+
+            case 'fcall':
+                self.call(statement)
+                code.emit(POP)
+
+            case 'if':
+                condition = statement.get('condition')
+                if condition.static_type == 'b':
+                    self.value(condition)
+                    outer = self.enter(statement.get('statements'), statement.get('else_statements'))
+                    branch = code.emit(IF_FALSE_UNCHECKED)
+                else:
+                    self.expression(condition)
+                    outer = self.enter(statement.get('statements'), statement.get('else_statements'))
+                    branch = code.emit(IF_FALSE)
+                self.block(statement.get('statements'))
+                if statement.get('else_statements'):
+                    skip = code.emit(JUMP)
+                    code.patch(branch, code.here())
+                    self.block(statement.get('else_statements'))
+                    code.patch(skip, code.here())
+                else:
+                    code.patch(branch, code.here())
+                self.leave(outer)
+
+            case 'while':
+                condition = statement.get('condition')
+                if statement.invariants:
+                    code.emit(RESET_INVARIANTS, code.const(tuple(statement.invariants)))
+                outer = self.enter(statement.get('statements'))     # one block for the whole loop, emptied every iteration
+                body_scope = self.scope
+                top = code.here()
+                self.scope = outer if outer is not None else body_scope     # the condition runs in the enclosing scope
+                self.value(condition)       # once per iteration
+                self.scope = body_scope
+                leave = code.emit(IF_FALSE_UNCHECKED if condition.static_type == 'b' else WHILE_FALSE)
+                if self.interpreter.count_loops:
+                    code.emit(COUNT_LOOP, code.const(statement))
+                exits = []
+                self.block(statement.get('statements'), exits)
+                if outer is not None and body_scope.layout:
+                    code.emit(RESET_BLOCK, code.const((None,) * len(body_scope.layout)))
+                code.emit(JUMP, top)
+                for at in exits:        # a bare return directly in the body leaves the loop
+                    code.patch(at, code.here())
+                code.patch(leave, code.here())
+                self.leave(outer)
+
+            case 'return':
+                val = statement.get('expression')
+                if val is None:
+                    code.emit(LOAD_CONST, code.const(None))
+                else:
+                    self.returned(val, 'nested')
+                at = code.emit(NESTED_RETURN)
+                if loop_exit is None:
+                    code.patch(at, code.here())
+                else:
+                    loop_exit.append(at)
+
+            case _:
+                pass
+
+    def assign(self, statement):
+        code = self.code
+        var = statement.get('var')
+        expression = statement.get('expression')
+
+        if var[-1] == 'f':
+            exp_name = expression.get('name')
+            if exp_name is None:            # let the tree walker raise whatever it raises here
+                code.emit(TREE_STATEMENT, code.const(statement))
+                return
+            if exp_name[:-1] != 'lambda':
+                code.emit(FUNC_REF, code.const(exp_name))
+            else:
+                self.expression(expression)
+        elif '.' not in var and always_accepts(var, expression.static_type):
+            self.value(expression)
+            code.emit(STORE_VAR_UNCHECKED, self.name(var))
+            return
+        else:
+            self.expression(expression)
+
+        if '.' in var:
+            code.emit(STORE_PATH, self.path(var))
+        else:
+            code.emit(STORE_VAR, self.name(var))
+
+    def call(self, statement, tail=None):      # tail: 'top' or 'nested' if the call is what a return returns
+        code = self.code
+        name = statement.get('name')
+        args = statement.get('args')
+
+        for arg in args:
+            if name == 'print':
+                self.value(arg)         # printed as it is now, not after the later arguments ran
+            else:
+                self.expression(arg)
+
+        if name[-1] == 'f':
+            if '.' in name:
+                code.emit(CALL_VAR, code.const((name, len(args), self.code.consts[self.path(name)], tail)))
+            else:
+                code.emit(CALL_VAR, code.const((name, len(args), self.scope.address(name), tail)))
+        elif name == 'print':
+            code.emit(CALL_PRINT, code.const(len(args)))
+        elif name == 'inputi' or name == 'inputs':
+            code.emit(CALL_INPUT, code.const((name, len(args))))
+        else:
+            types = signature(args)
+            target = self.interpreter.overload(name, types) if types is not None else None
+            code.emit(CALL_NAMED, code.const((name, len(args), target, tail)))
+
+    def value(self, expression):        # Like expression, but leaves a value rather than a Variable
+        if expression.elem_type == 'qname':
+            name = expression.get('name')
+            if '.' in name:
+                self.code.emit(LOAD_PATH_VALUE, self.path(name))
+            else:
+                self.code.emit(LOAD_VAR_VALUE, self.name(name))
+        else:
+            self.expression(expression)     # only qnames evaluate to Variables
+
+    def expression(self, expression):
+        code = self.code
+        expression_type = expression.elem_type
+
+        match expression_type:
+            case 'int' | 'string' | 'bool':
+                code.emit(LOAD_CONST, code.const(expression.get('val')))
+            case 'nil':
+                code.emit(LOAD_CONST, code.const(Nil))
+            case '@':
+                code.emit(NEW_OBJECT)
+            case 'qname':
+                name = expression.get('name')
+                if '.' in name:
+                    code.emit(LOAD_PATH, self.path(name))
+                else:
+                    code.emit(LOAD_VAR, self.name(name))
+            case 'fcall':
+                self.call(expression)
+            case 'func':
+                if expression.get('name')[:-1] == 'lambda':
+                    code.emit(MAKE_LAMBDA, code.const((expression, self.resolver.closure(expression, self.scope))))
+                else:
+                    code.emit(LOAD_CONST, code.const(None))
+            case 'invariant':       # see licm.py
+                at = code.emit(INVARIANT)
+                self.expression(expression.get('expr'))
+                code.emit(STORE_INVARIANT, code.const(expression))
+                code.patch(at, code.const((expression, code.here())))
+            case 'convert':
+                self.value(expression.get('expr'))
+                code.emit(CONVERT, code.const(expression.get('to_type')))
+            case 'neg' | '!':
+                op1 = expression.get('op1')
+                self.value(op1)
+                unchecked = UNCHECKED_OPS.get((expression_type, op1.static_type))
+                if unchecked is not None:
+                    code.emit(UNARY_UNCHECKED, code.const(unchecked))
+                else:
+                    code.emit(NEG if expression_type == 'neg' else NOT)
+            case _:
+                if self.interpreter.short_circuit and expression_type in ('&&', '||'):     # see Interpreter.logical
+                    self.value(expression.get('op1'))
+                    at = code.emit(SHORT_CIRCUIT)
+                    op2 = expression.get('op2')
+                    self.value(op2)
+                    if op2.static_type != 'b':
+                        code.emit(CHECK_BOOL)
+                    code.patch(at, code.const((expression_type == '||', code.here())))
+                elif expression_type in BINARY_OPS:
+                    op1 = expression.get('op1')
+                    op2 = expression.get('op2')
+                    self.value(op1)
+                    self.value(op2)
+                    unchecked = None
+                    if op1.static_type == op2.static_type:
+                        unchecked = UNCHECKED_OPS.get((expression_type, op1.static_type))
+                    if unchecked is not None:
+                        code.emit(BINARY_UNCHECKED, code.const(unchecked))
+                    else:
+                        code.emit(BINARY_OPS[expression_type])
+                else:
+                    code.emit(LOAD_CONST, code.const(None))
+
+
+def retrieve_path(env, path, interp):       # env.retrieve for a dotted name, straight down its pre-split path if it can
+    name, addresses, steps, last, cache = path
+    if addresses is not None:
+        obj = descend(lookup(env, addresses), steps)
+        if obj is not None:
+            member = cache.get(obj, last)
+            if member is not None:
+                return member
+    return env.retrieve(name, interp)
+
+
+TAIL_TYPES = ('i', 's', 'b', 'o', 'v')      # return types whose check passes anything a function of the same type returns
+
+
+def returned_expressions(statements):       # the expression of every return in statements and their blocks
+    for statement in statements or []:
+        match statement.elem_type:
+            case 'return':
+                if statement.get('expression') is not None:
+                    yield statement.get('expression')
+            case 'if' | 'while':
+                yield from returned_expressions(statement.get('statements'))
+                yield from returned_expressions(statement.get('else_statements'))
+
+
+### ## ###
+### VM ###
+### ## ###
+
+class VM:
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.codes = {}     # id(statements) -> (statements, Code), see Compiler.bodies
+        self.resolver = Resolver()
+        self.none_results = None        # id(statements) -> whether a call of that function can give None
+
+    def code_for(self, fcn):
+        entry = self.codes.get(id(fcn.statements))
+        if entry is None:
+            scope = self.resolver.function(fcn)
+            with compiling(fcn.name):
+                entry = (fcn.statements, Lowering(fcn.name, scope, self.resolver, self.interpreter).function(fcn.statements))
+            self.codes[id(fcn.statements)] = entry
+        return entry[1]
+
+    def tail_call(self, caller, target, tail):      # whether caller returns what target gives unchanged
+        t = caller.name[-1]
+        if t != target.name[-1] or t not in TAIL_TYPES or caller.name == 'main':
+            return False            # the caller's return check could still change or reject it
+        return tail == 'top' or not self.may_return_none(target)       # a nested return of None does not return
+
+    def may_return_none(self, fcn):
+        if self.none_results is None:       # named functions first, together, as they can call each other
+            named = list(self.interpreter.function_defs.values())
+            known = {id(f.statements): False for f in named}
+            changed = True
+            while changed:
+                changed = False
+                for f in named:
+                    if not known[id(f.statements)] and self.gives_none(f, known):
+                        known[id(f.statements)] = True
+                        changed = True
+            self.none_results = known
+        result = self.none_results.get(id(fcn.statements))
+        if result is None:          # a lambda, its body stays alive as long as the program does
+            result = self.none_results[id(fcn.statements)] = self.gives_none(fcn, self.none_results)
+        return result
+
+    def gives_none(self, fcn, known):       # known: id(statements) -> may_return_none of named functions, so far
+        if fcn.name[-1] in ('v', 'f') or fcn.name == 'main':     # f: a top level return hands on whatever its target gives
+            return True
+        for val in returned_expressions(fcn.statements):
+            if val.elem_type == 'invariant':
+                val = val.get('expr')
+            if val.elem_type == 'convert':
+                return True
+            if val.elem_type != 'fcall':
+                continue            # names, literals and operators always give a value
+            name = val.get('name')
+            if name == 'print' or name[-1] == 'f':
+                return True
+            for target in self.interpreter.overloads.get(name, {}).get(len(val.get('args')), {}).values():
+                if known.get(id(target.statements), True):
+                    return True
+        return False
+
+    def bind(self, fcn, args, frame=None):      # frame: the caller's own, to reuse when fcn takes over from it
+        if type(fcn) is LambdaFcn:      # a lambda keeps its own environment
+            return fcn.bind(self.interpreter, args)
+        return self.resolver.function(fcn).bind(fcn, args, self.interpreter, frame)
+
+    def run(self, fcn, args=[]):
+        interp = self.interpreter
+        shapes = interp.shapes
+        error = interp.error
+        loop_counts = interp.loop_counts
+
+        env = self.bind(fcn, args)
+        if isinstance(env, ErrorType):
+            return env
+
+        code = self.code_for(fcn)
+        ops = code.ops
+        consts = code.consts
+        pc = 0
+        stack = []
+        frames = []     # saved (ops, consts, pc, stack, env, fcn, args) of every caller
+        max_frames = interp.max_depth - 1       # the running function is not in frames
+
+        def arith_error():
+            error(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation",)
+
+        def bool_error():
+            error(ErrorType.TYPE_ERROR, "Incompatible types for boolean operation",)
+
+        while True:
+            op = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+
+            if op == LOAD_VAR_VALUE:
+                name, addresses = consts[arg]
+                display = env.display
+                for level, slot in addresses:       # same lookup as Environment.retrieve for plain names
+                    val = display[level][slot]
+                    if val is not None:
+                        break
+                else:
+                    error(ErrorType.NAME_ERROR, f"Error retrieving {name}")
+                while isinstance(val, Variable):
+                    val = val.get_val()
+                stack.append(val)
+                continue
+
+            if op == LOAD_CONST:
+                stack.append(consts[arg])
+                continue
+
+            if op == BINARY_UNCHECKED:
+                b = stack.pop()
+                stack[-1] = consts[arg](stack[-1], b)
+                continue
+
+            if op == STORE_VAR_UNCHECKED:
+                var, addresses = consts[arg]
+                display = env.display
+                for level, slot in addresses:
+                    target = display[level][slot]
+                    if target is not None:
+                        break
+                else:
+                    error(ErrorType.NAME_ERROR, f"Error assigning {stack[-1]} to {var}, probably already declared or incompatible.")
+                target.set_val(stack.pop())
+                continue
+
+            if op == IF_FALSE_UNCHECKED:
+                if not stack.pop():
+                    pc = arg
+                continue
+
+            if op == PUSH_BLOCK:
+                env = Frame(consts[arg], env)
+                continue
+
+            if op == POP_BLOCK:
+                env = env.parent
+                continue
+
+            if op == RESET_BLOCK:
+                env.values[:] = consts[arg]
+                continue
+
+            if op == INVARIANT:
+                node, end = consts[arg]
+                if node.cached is not None:
+                    stack.append(node.cached)
+                    pc = end
+                continue
+
+            if op == STORE_INVARIANT:
+                consts[arg].cached = stack[-1]
+                continue
+
+            if op == STORE_VAR:
+                var, addresses = consts[arg]
+                exp = stack.pop()
+                target = lookup(env, addresses)
+                if target is None:
+                    error(ErrorType.NAME_ERROR, f"Error assigning {exp} to {var}, probably already declared or incompatible.")
+                ac_exp = exp.get_val() if isinstance(exp, Variable) else exp
+                if not env.compare_types(var, ac_exp, interp):
+                    error(ErrorType.TYPE_ERROR, f"Error assigning {exp} to {var}, probably already declared or incompatible.")
+                target.set_val(ac_exp)
+                continue
+
+            if op <= OR and op >= ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if op == ADD:
+                    if type(a) != type(b) or type(a) not in (int, str):
+                        arith_error()
+                    stack[-1] = a + b
+                elif op <= GE:
+                    if type(a) != int or type(b) != int:
+                        arith_error()
+                    if op == SUB:
+                        stack[-1] = a - b
+                    elif op == MUL:
+                        stack[-1] = a * b
+                    elif op == DIV:
+                        stack[-1] = a // b
+                    elif op == LT:
+                        stack[-1] = a < b
+                    elif op == LE:
+                        stack[-1] = a <= b
+                    elif op == GT:
+                        stack[-1] = a > b
+                    else:
+                        stack[-1] = a >= b
+                elif op == EQ:
+                    stack[-1] = equals(a, b)
+                elif op == NE:
+                    stack[-1] = not equals(a, b)
+                else:
+                    if type(a) != bool or type(b) != bool:
+                        bool_error()
+                    stack[-1] = (a and b) if op == AND else (a or b)
+                continue
+
+            if op == JUMP:
+                pc = arg
+                continue
+
+            if op == IF_FALSE:
+                condition = stack.pop()
+                condition = condition.get_val() if isinstance(condition, Variable) else condition
+                if (condition != True and condition != False):
+                    error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
+                if not condition == True:
+                    pc = arg
+                continue
+
+            if op == LOAD_VAR:
+                name, addresses = consts[arg]
+                val = lookup(env, addresses)
+                if val is None:
+                    error(ErrorType.NAME_ERROR, f"Error retrieving {name}")
+                stack.append(val)
+                continue
+
+            if op == LOAD_PATH or op == LOAD_PATH_VALUE:
+                val = retrieve_path(env, consts[arg], interp)
+                if isinstance(val, ErrorType):
+                    error(val, f"Error retrieving {consts[arg][0]}")
+                stack.append(unwrap(val) if op == LOAD_PATH_VALUE else val)
+                continue
+
+            if op == STORE_PATH:
+                var, addresses, steps, last, cache = consts[arg]
+                exp = stack.pop()
+                obj = None if addresses is None else descend(lookup(env, addresses), steps)
+                if obj is None:         # off the straight path, let Environment.assign do (or reject) it
+                    ret = env.assign(var, exp, interp)
+                else:
+                    ret = env.store(obj, last, var, exp, interp, cache.get(obj, last))
+                if isinstance(ret, ErrorType):
+                    error(ret, f"Error assigning {exp} to {var}, probably already declared or incompatible.")
+                continue
+
+            if op == POP:
+                stack.pop()
+                continue
+
+            if op == CALL_NAMED or op == CALL_VAR:
+                if op == CALL_NAMED:
+                    name, argc, target, tail = consts[arg]
+                else:
+                    name, argc, addresses, tail = consts[arg]
+                call_args = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+
+                if op == CALL_NAMED:
+                    if target is None:
+                        target = interp.overload(name, interp.get_type_signatures(call_args))
+                    if target is None:
+                        error(ErrorType.NAME_ERROR, f"Function {name} has not been defined",)
+                elif '.' in name:
+                    target = retrieve_path(env, addresses, interp)
+                    if isinstance(target, ErrorType):
+                        error(target)
+                    target = unwrap(target)
+                else:
+                    target = lookup(env, addresses)
+                    if target is None:
+                        error(ErrorType.NAME_ERROR)
+                    target = unwrap(target)
+
+                if tail is not None and self.tail_call(fcn, target, tail):      # the result would be returned as is,
+                    if target is fcn and env.parent is None:                    # so the target takes over this frame
+                        new_env = self.bind(target, call_args, env)     # its own environment too, if it calls itself
+                    else:
+                        new_env = self.bind(target, call_args)
+                    if isinstance(new_env, ErrorType):
+                        error(new_env)
+                    code = self.code_for(target)
+                    ops = code.ops
+                    consts = code.consts
+                    pc = 0
+                    stack = []
+                    env = new_env
+                    fcn = target
+                    args = call_args
+                    continue
+
+                new_env = self.bind(target, call_args)
+                if isinstance(new_env, ErrorType):
+                    error(new_env)
+
+                if len(frames) >= max_frames:
+                    error(ErrorType.STACK_ERROR, f"More than {interp.max_depth} nested calls")
+                frames.append((ops, consts, pc, stack, env, fcn, args))
+                code = self.code_for(target)
+                ops = code.ops
+                consts = code.consts
+                pc = 0
+                stack = []
+                env = new_env
+                fcn = target
+                args = call_args
+                continue
+
+            if op == SHORT_CIRCUIT:
+                decides, end = consts[arg]
+                a = stack[-1]
+                if type(a) is not bool:
+                    bool_error()
+                if a == decides:
+                    pc = end
+                else:
+                    stack.pop()
+                continue
+
+            if op == CHECK_BOOL:
+                if type(stack[-1]) is not bool:
+                    bool_error()
+                continue
+
+            if op == UNARY_UNCHECKED:
+                stack[-1] = consts[arg](stack[-1])
+                continue
+
+            if op == NEG:
+                a = stack[-1]
+                if type(a) != int:
+                    arith_error()
+                stack[-1] = -a
+                continue
+
+            if op == NOT:
+                a = stack[-1]
+                if type(a) != bool:
+                    bool_error()
+                stack[-1] = not a
+                continue
+
+            if op == WHILE_FALSE:
+                cond = stack.pop()
+                if cond is not True:
+                    if (cond != True and cond != False) and (cond != 'true' and cond != 'false'):
+                        error(ErrorType.TYPE_ERROR, "Condition does not evaluate to a boolean",)
+                    if cond != True:
+                        pc = arg
+                continue
+
+            if op == COUNT_LOOP:
+                loop_counts[consts[arg]] = loop_counts.get(consts[arg], 0) + 1
+                continue
+
+            if op == RESET_INVARIANTS:
+                for node in consts[arg]:
+                    node.cached = None
+                continue
+
+            if op == DEFINE:
+                statement = consts[arg]
+                ret = env.define(statement)
+                if ret:
+                    scope = "function" if statement.elem_type == 'vardef' else "block"
+                    error(ret, f"Error defining {scope}-scope variable {statement}, probably already declared.")
+                continue
+
+            if op == NEW_OBJECT:
+                stack.append(Object(shapes))
+                continue
+
+            if op == FUNC_REF:
+                stack.append(env.retrieve_function(consts[arg], interp))
+                continue
+
+            if op == MAKE_LAMBDA:
+                node, closure = consts[arg]
+                target = interp.define_function(node, None, True)
+                target.env = closure.capture(env)
+                stack.append(target)
+                continue
+
+            if op == CONVERT:
+                stack[-1] = self.convert(consts[arg], stack[-1])
+                continue
+
+            if op == CALL_PRINT:
+                argc = consts[arg]
+                call_args = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                interp.output("".join(to_str(unwrap(a)) for a in call_args))
+                stack.append(None)
+                continue
+
+            if op == CALL_INPUT:
+                name, argc = consts[arg]
+                call_args = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                if argc > 1:
+                    error(ErrorType.NAME_ERROR, f"No {name}() function found that takes > 1 parameter",)
+                if argc == 1:
+                    interp.output(to_str(unwrap(call_args[0])))
+                stack.append((int if name == 'inputi' else str)(interp.get_input()))
+                continue
+
+            if op == TREE_STATEMENT:
+                interp.evaluate_statement(consts[arg], env)
+                continue
+
+            # Everything below leaves the current function with `result`
+
+            if op == NESTED_RETURN:
+                val = stack.pop()
+                if isinstance(val, ErrorType):
+                    error(val, f"Error returned from return statement in environment {env}")
+                if val is None:
+                    pc = arg
+                    continue
+                result = fcn.ret(val, interp)
+
+            elif op == RETURN_UNCHECKED:
+                result = stack.pop()
+
+            elif op == RETURN_VALUE:
+                val = stack.pop()
+                result = val if isinstance(val, ErrorType) else fcn.ret(val, interp)
+
+            elif op == RETURN_DEFAULT:
+                result = default(fcn, env)
+
+            elif op == RETURN_FUNCTION:
+                val, closure = consts[arg]
+                n = val.get('name')
+                if n[:-1] == 'lambda':
+                    target = LambdaFcn(None, n, val.get('args'), val.get('statements'))
+                    target.env = closure.capture(env)
+                else:
+                    target = env.retrieve_function(n, interp)
+
+                if isinstance(target, ErrorType):
+                    result = target
+                else:
+                    new_env = self.bind(target, args)
+                    if isinstance(new_env, ErrorType):
+                        result = new_env
+                    else:       # the target's result is returned as is, so it simply replaces this frame
+                        code = self.code_for(target)
+                        ops = code.ops
+                        consts = code.consts
+                        pc = 0
+                        stack = []
+                        env = new_env
+                        fcn = target
+                        continue
+
+            else:
+                raise RuntimeError(f"Unknown opcode {op}")
+
+            if not frames:
+                return result
+
+            ops, consts, pc, stack, env, fcn, args = frames.pop()
+            if isinstance(result, ErrorType):
+                error(result)
+            stack.append(result)
+
+
+    def convert(self, t, subject):      # Same rules as the tree walker's convert case
+        interp = self.interpreter
+        t_expr = type(subject)
+        if t_expr == Object or subject == Nil:
+            interp.error(ErrorType.TYPE_ERROR, f"Incompatible type for conversion (object)")
+
+        if t == 'str':
+            if t_expr == str or t_expr == int:
+                return str(subject)
+            if t_expr == bool:
+                return "true" if subject else "false"
+
+        if t == 'int':
+            if t_expr == str:
+                try:
+                    return int(subject)
+                except:
+                    interp.error(ErrorType.TYPE_ERROR, f"Incompatible type for conversion (object)")
+            if t_expr == int:
+                return subject
+            if t_expr == bool:
+                return 1 if subject else 0
+
+        if t == 'bool':
+            if t_expr == str:
+                return subject != ""
+            if t_expr == int:
+                return subject != 0
+            if t_expr == bool:
+                return subject
+        return None